@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""Measure how fast World.step runs and where the time goes.
+
+Runs seeded worlds for a range of sizes, populations and view distances and writes steps/s and the
+time per phase of each to a JSON file, to compare between revisions. Run from the root of the repo:
+
+    python -m benchmarks.simulation --output before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import time
+
+import numpy as np
+
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from shared.timing import TIMER
+from simplegrid.world import World
+
+
+def population(**counts):
+    return [{'creature': creature, 'count': count} for creature, count in counts.items()]
+
+
+def mixed(cows, wolves):
+    """SmartCows and DeepCows competing, with wolves."""
+    return population(SmartCow=cows, DeepCow=cows, Wolf=wolves)
+
+
+def scripted(cows, wolves):
+    """The same, with SimpleCows in place of the DeepCows, so no agent is involved."""
+    return population(SmartCow=cows, SimpleCow=cows, Wolf=wolves)
+
+
+CONFIGS = [
+    {'world_size': 30, 'population': scripted(4, 1), 'view_distance': 1},
+    {'world_size': 60, 'population': scripted(6, 2), 'view_distance': 3},
+    {'world_size': 60, 'population': scripted(30, 4), 'view_distance': 3},
+    {'world_size': 120, 'population': scripted(60, 8), 'view_distance': 3},
+    {'world_size': 250, 'population': scripted(250, 30), 'view_distance': 5},
+    {'world_size': 250, 'population': population(SmartCow=500, Wolf=50), 'view_distance': 5},
+    {'world_size': 30, 'population': mixed(4, 1), 'view_distance': 1},
+    {'world_size': 60, 'population': mixed(6, 2), 'view_distance': 3},
+    {'world_size': 60, 'population': mixed(30, 4), 'view_distance': 3},
+    {'world_size': 120, 'population': mixed(60, 8), 'view_distance': 3},
+    {'world_size': 120, 'population': mixed(60, 8), 'view_distance': 5},
+    {'world_size': 250, 'population': mixed(250, 30), 'view_distance': 5},
+    {'world_size': 250, 'population': population(DeepCow=500), 'view_distance': 5},
+]
+PHASES = ('observation', 'policy', 'act', 'action', 'learning', 'replay', 'recording', 'grass')
+
+
+def revision():
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+        return output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_config(config, num_steps, seed):
+    """Run a seeded world with the settings in config for num_steps steps and return the measurements."""
+    settings = ExperimentSettings(None)
+    for key, value in config.items():
+        setattr(settings, key, value)
+    settings.seed = seed
+    settings.end_condition = 'extinction'  # Keep going when one kind of cow wins, the population is what counts
+    if any(entry['creature'] == 'DeepCow' for entry in config['population']):
+        from simplegrid.deep_cow import DeepCow  # Only the configs with DeepCows need its agent
+
+        DeepCow.agent = None  # The size of its input depends on the view distance
+    world = World(settings)
+    world.reset(Episode())
+
+    TIMER.reset()
+    TIMER.enabled = True
+    episodes = 1
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # World announces the winner of every episode
+        for _ in range(num_steps):
+            if not world.step():
+                world.reset(Episode())
+                episodes += 1
+    elapsed = time.perf_counter() - start
+    TIMER.enabled = False
+
+    phases = TIMER.report()
+    other = elapsed - sum(phase['seconds'] for phase in phases.values())
+    return dict(
+        config,
+        steps=num_steps,
+        episodes=episodes,
+        seconds=elapsed,
+        steps_per_second=num_steps / elapsed,
+        phases=dict(phases, other={'seconds': other, 'calls': num_steps}),
+    )
+
+
+def main(num_steps, seed, output):
+    results = []
+    print(f'{"size":>5} {"view":>4} {"steps/s":>8}  ' + ' '.join(f'{p:>11}' for p in PHASES) + '  population')
+    for config in CONFIGS:
+        result = run_config(config, num_steps, seed)
+        results.append(result)
+        shares = [result['phases'].get(phase, {'seconds': 0})['seconds'] / result['seconds'] for phase in PHASES]
+        print(
+            f'{config["world_size"]:>5} {config["view_distance"]:>4} {result["steps_per_second"]:>8.1f}  '
+            + ' '.join(f'{share:>11.1%}' for share in shares)
+            + '  '
+            + ', '.join(f'{entry["count"]} {entry["creature"]}' for entry in config['population'])
+        )
+    with open(output, 'w') as fout:
+        json.dump(
+            {
+                'revision': revision(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'seed': seed,
+                'results': results,
+            },
+            fout,
+            indent=2,
+        )
+    print('Results written to', output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=500, help='Steps to run for each configuration.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the worlds.')
+    parser.add_argument('--output', type=str, default='benchmark.json', help='JSON file to write the results to.')
+    args = parser.parse_args()
+    main(args.steps, args.seed, args.output)
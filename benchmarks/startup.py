@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Measure how long it takes before a simulation can start.
+
+Runs each scenario a few times in a fresh interpreter, so imports are never cached, and writes the
+median wall clock time of each to a JSON file. The time includes starting Python itself, which the
+interpreter scenario shows on its own. Run from the root of the repo:
+
+    python -m benchmarks.startup --output startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.simulation import revision
+
+WORLD = '''
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from simplegrid.world import World
+settings = ExperimentSettings(None)
+settings.population = {population}
+world = World(settings)
+world.reset(Episode())
+world.step()
+'''
+SCENARIOS = {
+    'interpreter': 'pass',
+    'import world': 'import simplegrid.world',
+    'scripted world': WORLD.format(
+        population=[{'creature': 'SmartCow', 'count': 10}, {'creature': 'Wolf', 'count': 2}]
+    ),
+    'deep cow world': WORLD.format(population=[{'creature': 'DeepCow', 'count': 3}]),  # Imports TensorFlow
+}
+
+
+def time_scenario(code, repeats):
+    """Return the median seconds it takes to run code in a new interpreter, repeats times over."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=root, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(repeats, output):
+    results = {}
+    for name, code in SCENARIOS.items():
+        try:
+            results[name] = time_scenario(code, repeats)
+            print(f'{name:>15} {results[name]:8.3f} s')
+        except subprocess.CalledProcessError:
+            results[name] = None
+            print(f'{name:>15}   failed')
+    with open(output, 'w') as fout:
+        json.dump(
+            {
+                'revision': revision(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'repeats': repeats,
+                'seconds': results,
+            },
+            fout,
+            indent=2,
+        )
+    print('Results written to', output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=5, help='Times to run each scenario.')
+    parser.add_argument('--output', type=str, default='startup.json', help='JSON file to write the results to.')
+    args = parser.parse_args()
+    main(args.repeats, args.output)
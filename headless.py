@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Run episodes back to back without a display or frame limiter, e.g. for training."""
+import argparse
+import contextlib
+import itertools
+import json
+import time
+
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from shared.timing import PROFILE_FILE, TIMER, format_phases, profiled
+from simplegrid.parallel_world import ParallelVectorWorld
+from simplegrid.vector_world import VectorWorld
+from simplegrid.world import World
+
+
+TIMINGS_FILE = 'timings.json'
+
+
+def main(settings, num_episodes, show_weights, vectorized=False, num_workers=1, timings=False):
+    if not vectorized:
+        world = World(settings)
+    elif num_workers > 1:
+        world = ParallelVectorWorld(settings, num_workers=num_workers)
+    else:
+        world = VectorWorld(settings)
+
+    total_steps = 0
+    episodes_done = 0
+    TIMER.enabled = timings
+    episode_timings = []
+    start = time.perf_counter()
+    try:
+        for episode_count in range(num_episodes) if num_episodes else itertools.count():
+            episode_start = time.perf_counter()
+            TIMER.reset()
+            world.reset(Episode.create(settings))
+            while world.step():
+                pass
+            episode_time = time.perf_counter() - episode_start
+            total_steps += world.steps
+            episodes_done += 1
+            print(
+                f'episode {episode_count}: {world.steps} steps in {episode_time:.1f}s '
+                f'({world.steps / episode_time:.0f} steps/s) {world.get_info()}'
+            )
+            if timings:
+                phases = TIMER.report()
+                print('  ' + format_phases({name: phase['seconds'] / world.steps for name, phase in phases.items()}))
+                episode_timings.append({'steps': world.steps, 'seconds': episode_time, 'phases': phases})
+            world.end(show_weights=show_weights)
+    finally:
+        if vectorized:
+            world.close()
+        if episode_timings and settings.path:
+            with open(settings.get_path(TIMINGS_FILE), 'w') as fout:
+                json.dump(episode_timings, fout, indent=2)
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            print(
+                f'{episodes_done} episodes, {total_steps} steps in {elapsed:.1f}s: '
+                f'{total_steps / elapsed:.0f} steps/s, {episodes_done / elapsed:.3f} episodes/s'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--experiment',
+        type=str,
+        required=False,
+        help='Specifies the experiment to run. This should be a directory '
+        'where the specific settings and various state files are stored. Directory will '
+        'be created and initialized if it does not exist.',
+    )
+    parser.add_argument(
+        '--episodes',
+        type=int,
+        default=0,
+        help='Number of episodes to run. Runs until interrupted if not given.',
+    )
+    parser.add_argument(
+        '--showweights',
+        required=False,
+        dest='show_weights',
+        action='store_true',
+        help='Shows network weights after each generation.',
+    )
+    parser.add_argument(
+        '--vectorized',
+        required=False,
+        action='store_true',
+        help='Runs SmartCows and Wolves in a VectorWorld instead, without DeepCows or recording.',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='With --vectorized, number of processes the creatures of a big world decide in.',
+    )
+    parser.add_argument(
+        '--timings',
+        required=False,
+        action='store_true',
+        help='Times the phases of each step, prints them per episode and saves them to timings.json.',
+    )
+    parser.add_argument(
+        '--profile',
+        required=False,
+        action='store_true',
+        help='Runs under cProfile and writes the stats to profile.pstats in the experiment directory.',
+    )
+    args = parser.parse_args()
+    settings = ExperimentSettings(args.experiment)
+    with contextlib.ExitStack() as stack:
+        if args.profile:
+            stack.enter_context(profiled(settings.get_path(PROFILE_FILE) or PROFILE_FILE))
+        main(settings, args.episodes, args.show_weights, args.vectorized, args.workers, args.timings)
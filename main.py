@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import argparse
 import itertools
+import os
+import time
 
 import contextlib
 
@@ -9,6 +11,7 @@ with contextlib.redirect_stdout(None):  # Suppress Hello from Pygame community m
 
 from shared.display import Display
 from shared.experiment_settings import ExperimentSettings
+from shared.timing import PROFILE_FILE, TIMER, profiled
 from simplegrid.deep_cow import DeepCow
 from simplegrid.world import World as World
 from shared.episode import Episode
@@ -16,28 +19,61 @@ from shared.episode import Episode
 FRAME_RATE = 60
 TITLE = 'Reinforced Artificial Life'
 
+# Fast forward: number keys pick how many steps to simulate per drawn frame. Unlimited draws once a second,
+# adaptive simulates for whatever is left of each frame at FRAME_RATE.
+UNLIMITED = 'unlimited'
+ADAPTIVE = 'adaptive'
+SPEED_KEYS = {pygame.K_1: 1, pygame.K_2: 10, pygame.K_3: 100, pygame.K_4: UNLIMITED, pygame.K_5: ADAPTIVE}
+FRAME_TIMES = {UNLIMITED: 1.0, ADAPTIVE: 1 / FRAME_RATE}
+
+
+def step_frame(world, speed, frame_start):
+    """Simulate the steps for one drawn frame. Returns the number of steps and whether the episode goes on."""
+    if speed in FRAME_TIMES:
+        deadline = frame_start + FRAME_TIMES[speed]
+        steps = 0
+        while True:
+            steps += 1
+            if not world.step():
+                return steps, False
+            if time.perf_counter() >= deadline:
+                return steps, True
+    for steps in range(1, speed + 1):
+        if not world.step():
+            return steps, False
+    return speed, True
+
 
 def main(settings, show_weights):
 
     display = Display(TITLE, settings.world_size, settings.scale)
     clock = pygame.time.Clock()
+    if settings.path:
+        display.sidebar[os.path.basename(os.path.normpath(settings.path))] = ''
 
-    world = World(settings, display)
+    world = World(settings)
+    speed = 1
 
     for episode_count in itertools.count():
         # Play an episode
-        episode = Episode()
+        episode = Episode.create(settings)
         display.sidebar['episode'] = episode_count
 
         world.reset(episode)
-        while True:
+        running = True
+        while running:
+            frame_start = time.perf_counter()
+            steps = 0
             # --- Event Processing
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    episode.close()  # Streamed episodes would miss their last frames otherwise
                     return
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_RETURN:
                         display.reset_offsets()
+                    elif event.key in SPEED_KEYS:
+                        speed = SPEED_KEYS[event.key]
 
             keys_down = pygame.key.get_pressed()
             if keys_down[pygame.K_LEFT]:
@@ -53,15 +89,18 @@ def main(settings, show_weights):
             elif keys_down[pygame.K_z]:
                 display.scale /= 1.05
             elif keys_down[pygame.K_d]:
-                print(DeepCow.agent.identity_test())
+                print(DeepCow.ensure_agent(settings).identity_test())
             else:
-                if not world.step():
-                    break
+                steps, running = step_frame(world, speed, frame_start)
+            display.sidebar['speed'] = speed if speed in FRAME_TIMES else f'{speed} steps/frame'
             display.clear()
             world.draw(display)
-            clock.tick(FRAME_RATE)
+            if speed not in FRAME_TIMES:
+                clock.tick(FRAME_RATE)
             display.flip()
             pygame.display.set_caption(TITLE + ' ' + world.get_info())
+            # Shown with the next frame, including the time spent drawing this one
+            display.sidebar['steps/s'] = round(steps / (time.perf_counter() - frame_start))
         world.end(show_weights=show_weights)
 
 
@@ -82,10 +121,26 @@ if __name__ == '__main__':
         action='store_true',
         help='Shows network weights after each generation.',
     )
+    parser.add_argument(
+        '--timings',
+        required=False,
+        action='store_true',
+        help='Shows how long the phases of a step take on average in the sidebar.',
+    )
+    parser.add_argument(
+        '--profile',
+        required=False,
+        action='store_true',
+        help='Runs under cProfile and writes the stats to profile.pstats in the experiment directory.',
+    )
     args = parser.parse_args()
     settings = ExperimentSettings(args.experiment)
+    TIMER.enabled = args.timings
     pygame.init()
     try:
-        main(settings, args.show_weights)
+        with contextlib.ExitStack() as stack:
+            if args.profile:
+                stack.enter_context(profiled(settings.get_path(PROFILE_FILE) or PROFILE_FILE))
+            main(settings, args.show_weights)
     finally:
         pygame.quit()
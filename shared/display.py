@@ -1,7 +1,11 @@
+import math
+
+import numpy as np
 import pygame
 from collections import OrderedDict
 
 sidebar_width = 200
+max_cell_pixels = 8  # Cells are rendered at most this big before the grid is scaled to the display
 
 
 class Display:
@@ -30,10 +34,61 @@ class Display:
         x, y = self.to_display_coords(x + 0.5, y + 0.5)
         pygame.draw.circle(self.screen, color, (x, y), int(radius * self.scale))
 
+    def circles(self, xs, ys, radii, colors):
+        """Draw many circles, computing their display coordinates in one go."""
+        xs, ys = self.to_display_coords(np.asarray(xs) + 0.5, np.asarray(ys) + 0.5)
+        radii = (np.asarray(radii) * self.scale).astype(int)
+        for x, y, radius, color in zip(xs.tolist(), ys.tolist(), radii.tolist(), colors):
+            pygame.draw.circle(self.screen, color, (x, y), radius)
+
+    def to_world_coords(self, x1, y1):
+        """Inverse of to_display_coords, without rounding."""
+        x = (x1 - self.offset_x - self.width / 2) / self.scale + self.world_size / 2
+        y = (y1 - self.offset_y - self.height / 2) / self.scale + self.world_size / 2
+        return x, y
+
     def to_display_coords(self, x, y):
-        x1 = int(self.offset_x + self.width / 2 + self.scale * (x - self.world_size / 2))
-        y1 = int(self.offset_y + self.height / 2 + self.scale * (y - self.world_size / 2))
-        return x1, y1
+        x1 = self.offset_x + self.width / 2 + self.scale * (x - self.world_size / 2)
+        y1 = self.offset_y + self.height / 2 + self.scale * (y - self.world_size / 2)
+        if isinstance(x1, np.ndarray):
+            return x1.astype(int), y1.astype(int)
+        return int(x1), int(y1)
+
+    def visible_cells(self):
+        """Return (x_lo, y_lo, x_hi, y_hi), the range of cells that is on screen. It is empty when x_lo >= x_hi."""
+        x_lo, y_lo = self.to_world_coords(0, 0)
+        x_hi, y_hi = self.to_world_coords(self.width, self.height)
+        x_lo, y_lo = max(0, math.floor(x_lo)), max(0, math.floor(y_lo))
+        x_hi, y_hi = min(self.world_size, math.ceil(x_hi)), min(self.world_size, math.ceil(y_hi))
+        return x_lo, y_lo, x_hi, y_hi
+
+    def grid(self, colors, padding=0.1, origin=(0, 0)):
+        """Draw a (width, height, 3) array of the colors of the cells from origin on as one scaled image.
+
+        Like calling rectangle for every cell, including the gap of padding around each, but only the
+        part of the world that is on screen gets rendered.
+        """
+        x_lo, y_lo, x_hi, y_hi = self.visible_cells()
+        x_lo, y_lo = max(x_lo, origin[0]), max(y_lo, origin[1])
+        x_hi, y_hi = min(x_hi, origin[0] + colors.shape[0]), min(y_hi, origin[1] + colors.shape[1])
+        if x_lo >= x_hi or y_lo >= y_hi:
+            return
+        visible = colors[x_lo - origin[0] : x_hi - origin[0], y_lo - origin[1] : y_hi - origin[1]]
+
+        pixels = max(1, min(max_cell_pixels, int(round(self.scale))))
+        image = np.repeat(np.repeat(visible, pixels, axis=0), pixels, axis=1)
+        gap = int(round(pixels * padding))
+        if gap:
+            cells = image.reshape(x_hi - x_lo, pixels, y_hi - y_lo, pixels, 3)
+            cells[:, :gap] = 0
+            cells[:, pixels - gap :] = 0
+            cells[:, :, :, :gap] = 0
+            cells[:, :, :, pixels - gap :] = 0
+
+        x1, y1 = self.to_display_coords(x_lo, y_lo)
+        x2, y2 = self.to_display_coords(x_hi, y_hi)
+        surface = pygame.transform.scale(pygame.surfarray.make_surface(image), (x2 - x1, y2 - y1))
+        self.screen.blit(surface, (x1, y1))
 
     def rectangle(self, x, y, size, color, padding=0):
         x1, y1 = self.to_display_coords(x + padding, y + padding)
@@ -53,6 +108,8 @@ class Display:
     def draw_sidebar(self):
         y = 10
         for key, val in self.sidebar.items():
+            if y > self.height - 20:  # No room for more
+                break
             self.draw_text(10, y, key)
             self.draw_text(130, y, str(val))
             y += 30
@@ -1,39 +1,254 @@
+import gzip
 import json
+import queue
+import sys
+import threading
+
 import numpy as np
 
+from shared.timing import TIMER
+
+CHUNK_SIZE = 16384  # Rows added to a column table whenever it runs full
+GRID_COLUMNS = (('x', np.int32), ('y', np.int32), ('value', np.int64))
+CREATURE_COLUMNS = (('id', np.int64), ('energy', np.float64), ('type', np.int16))
+NO_TYPE = -1
+STREAM_EVERY = 100  # Frames handed to the writer thread at once when streaming
+MAX_PENDING = 16  # Batches of frames the writer may fall behind before the simulation has to wait
+WRITER_TIMEOUT = 1  # Seconds between checks that the writer is still alive while waiting for it
+
+
+class Columns:
+    """A table of equally long numpy columns that grows in chunks of CHUNK_SIZE rows."""
+
+    def __init__(self, columns):
+        self.arrays = {name: np.empty(CHUNK_SIZE, dtype=dtype) for name, dtype in columns}
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        return self.arrays[name][: self.length]
+
+    def append(self, *values):
+        if self.length == len(next(iter(self.arrays.values()))):
+            for name, array in self.arrays.items():
+                self.arrays[name] = np.concatenate((array, np.empty(CHUNK_SIZE, dtype=array.dtype)))
+        for array, value in zip(self.arrays.values(), values):
+            array[self.length] = value
+        self.length += 1
+
+    def set_column(self, name, values):
+        """Replace the contents of the whole table column by column, e.g. when loading."""
+        values = np.asarray(values, dtype=self.arrays[name].dtype)
+        self.arrays[name] = values
+        self.length = len(values)
+
 
 class Episode:
-    def __init__(self):
-        self.frames = []  # This is the episode, a list of frames
-        self.cur_grid = []  # Internal param to keep track of the current frame grid
-        self.cur_creatures = []  # Internal param to keep track of the current frame creatures
+    """Recording of an episode as the changes to the grid and the creatures in each frame.
+
+    Changes are kept in columns of numpy arrays rather than per change dicts. grid_offsets[i] and
+    creature_offsets[i] are the rows at which frame i starts, so frame i spans up to offsets[i + 1].
+
+    If a writer is given, finished frames are handed to it in batches and dropped from memory, so
+    memory use does not grow with the length of the episode.
+    """
+
+    def __init__(self, writer=None):
+        self.grid = Columns(GRID_COLUMNS)
+        self.creatures = Columns(CREATURE_COLUMNS)
+        self.creature_types = []  # Names of the creature classes, creatures refer to these by index
+        self.grid_offsets = [0]
+        self.creature_offsets = [0]
+        self.writer = writer
+
+    @classmethod
+    def create(cls, settings):
+        """Create an episode to record in the way the settings ask for."""
+        if settings.stream_episodes and settings.path:
+            if settings.compress_stream:
+                path = settings.get_path('episodes.jsonl.gz')
+            else:
+                path = settings.get_path('episodes.jsonl')
+            return cls(EpisodeWriter(path, settings.compress_stream))
+        return cls()
+
+    @property
+    def num_frames(self):
+        return len(self.grid_offsets) - 1
 
     def creature_change(self, creature_id, energy, creature_type=None):
-        creature = {'id': creature_id, 'energy': energy}
+        TIMER.start('recording')
         if creature_type:
-            creature['creature_type'] = creature_type
-        self.cur_creatures += [creature]
+            if creature_type not in self.creature_types:
+                self.creature_types.append(creature_type)
+            type_index = self.creature_types.index(creature_type)
+        else:
+            type_index = NO_TYPE
+        self.creatures.append(creature_id, energy, type_index)
+        TIMER.stop()
 
     def grid_change(self, x, y, value):
-        self.cur_grid += [{'x': x, 'y': y, 'value': value}]
+        TIMER.start('recording')
+        self.grid.append(x, y, value)
+        TIMER.stop()
 
     def next_frame(self):
-        self.frames += [{'creatures': self.cur_creatures, 'grid': self.cur_grid}]
-        self.cur_creatures = []
-        self.cur_grid = []
+        TIMER.start('recording')
+        self.grid_offsets.append(len(self.grid))
+        self.creature_offsets.append(len(self.creatures))
+        if self.writer and self.num_frames >= STREAM_EVERY:
+            self.writer.write(self.take_frames())
+        TIMER.stop()
+
+    def take_frames(self):
+        """Move all finished frames to a new Episode, leaving this one empty but for its creature types."""
+        taken = Episode()
+        for name, _ in GRID_COLUMNS:
+            taken.grid.set_column(name, self.grid[name][: self.grid_offsets[-1]].copy())
+        for name, _ in CREATURE_COLUMNS:
+            taken.creatures.set_column(name, self.creatures[name][: self.creature_offsets[-1]].copy())
+        taken.grid_offsets = self.grid_offsets
+        taken.creature_offsets = self.creature_offsets
+        taken.creature_types = list(self.creature_types)
+        self.grid.length = 0
+        self.creatures.length = 0
+        self.grid_offsets = [0]
+        self.creature_offsets = [0]
+        return taken
 
-    def load(self):
-        pass
+    def frame(self, idx):
+        """Return frame idx in the JSON lines format: {'creatures': [...], 'grid': [...]}."""
+        grid_rows = slice(self.grid_offsets[idx], self.grid_offsets[idx + 1])
+        grid = [
+            {'x': x, 'y': y, 'value': value}
+            for x, y, value in zip(*(self.grid[name][grid_rows].tolist() for name, _ in GRID_COLUMNS))
+        ]
+        creature_rows = slice(self.creature_offsets[idx], self.creature_offsets[idx + 1])
+        creatures = []
+        for creature_id, energy, type_index in zip(
+            *(self.creatures[name][creature_rows].tolist() for name, _ in CREATURE_COLUMNS)
+        ):
+            # Energy is stored as a float, write whole numbers as ints like the creatures have them
+            creature = {'id': creature_id, 'energy': int(energy) if energy.is_integer() else energy}
+            if type_index != NO_TYPE:
+                creature['creature_type'] = self.creature_types[type_index]
+            creatures.append(creature)
+        return {'creatures': creatures, 'grid': grid}
+
+    def close(self):
+        """Hand the last frames to the writer, if streaming, and wait for it to finish the file."""
+        if self.writer:
+            self.writer.write(self.take_frames())
+            self.writer.close()
+            self.writer = None
 
     def save(self, settings):
-        path = settings.get_path('episodes.jsonl')
-        if path:
-            with open(path, 'w') as f:
-                f.write('\n'.join([json.dumps(frame, default=fallback_to_int) for frame in self.frames]))
+        if self.writer:
+            self.close()
+        elif settings.episode_format == 'jsonl':
+            path = settings.get_path('episodes.jsonl')
+            if path:
+                self.save_jsonl(path)
+        else:
+            path = settings.get_path('episodes.npz')
+            if path:
+                self.save_npz(path)
+
+    def save_npz(self, path):
+        arrays = {'grid_' + name: self.grid[name] for name, _ in GRID_COLUMNS}
+        arrays.update({'creature_' + name: self.creatures[name] for name, _ in CREATURE_COLUMNS})
+        np.savez_compressed(
+            path,
+            grid_offsets=np.asarray(self.grid_offsets, dtype=np.int64),
+            creature_offsets=np.asarray(self.creature_offsets, dtype=np.int64),
+            creature_types=np.asarray(self.creature_types, dtype=str),
+            **arrays,
+        )
+
+    def save_jsonl(self, path):
+        with open(path, 'w') as f:
+            f.write('\n'.join(json.dumps(self.frame(idx)) for idx in range(self.num_frames)))
+
+    @classmethod
+    def load(cls, path):
+        """Load an episode saved as .npz, .jsonl or a streamed .jsonl.gz."""
+        episode = cls()
+        if path.endswith('.jsonl') or path.endswith('.jsonl.gz'):
+            with (gzip.open if path.endswith('.gz') else open)(path, 'rt') as fin:
+                for line in fin:
+                    if line.strip():
+                        frame = json.loads(line)
+                        for change in frame['grid']:
+                            episode.grid_change(change['x'], change['y'], change['value'])
+                        for change in frame['creatures']:
+                            episode.creature_change(change['id'], change['energy'], change.get('creature_type'))
+                        episode.next_frame()
+        else:
+            with np.load(path) as archive:
+                for name, _ in GRID_COLUMNS:
+                    episode.grid.set_column(name, archive['grid_' + name])
+                for name, _ in CREATURE_COLUMNS:
+                    episode.creatures.set_column(name, archive['creature_' + name])
+                episode.grid_offsets = archive['grid_offsets'].tolist()
+                episode.creature_offsets = archive['creature_offsets'].tolist()
+                episode.creature_types = archive['creature_types'].tolist()
+        return episode
+
+
+class EpisodeWriter(threading.Thread):
+    """Background thread appending batches of frames to a JSON lines file, optionally gzip compressed.
+
+    The simulation only waits on write when the writer is more than MAX_PENDING batches behind. If the
+    thread died, write and close raise instead of waiting forever.
+    """
+
+    def __init__(self, path, compress=False):
+        super().__init__(daemon=True)
+        self.path = path
+        self.compress = compress
+        self.pending = queue.Queue(maxsize=MAX_PENDING)
+        self.error = None  # What stopped the thread, if it failed
+        self.start()
+
+    def write(self, episode):
+        self.put(episode)
+
+    def close(self):
+        """Write what is still pending and wait for the file to be closed."""
+        self.put(None)
+        self.join()
+        if self.error:
+            raise RuntimeError(f'Writing {self.path} failed') from self.error
+
+    def put(self, item):
+        while True:
+            if not self.is_alive():
+                raise RuntimeError(f'The writer of {self.path} stopped') from self.error
+            try:
+                self.pending.put(item, timeout=WRITER_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def run(self):
+        try:
+            with (gzip.open if self.compress else open)(self.path, 'wt') as fout:
+                while True:
+                    episode = self.pending.get()
+                    if episode is None:
+                        break
+                    fout.write(''.join(json.dumps(episode.frame(idx)) + '\n' for idx in range(episode.num_frames)))
+        except Exception as error:
+            self.error = error
 
 
-def fallback_to_int(o):
-    """json.dumps cannot handle np.int64 data so this helper function is to convert it to int"""
-    if isinstance(o, np.int64):
-        return int(o)
-    raise TypeError
+if __name__ == '__main__':
+    # Convert between formats, e.g.: python -m shared.episode episodes.npz episodes.jsonl
+    source, target = sys.argv[1:]
+    loaded = Episode.load(source)
+    if target.endswith('.jsonl'):
+        loaded.save_jsonl(target)
+    else:
+        loaded.save_npz(target)
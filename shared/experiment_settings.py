@@ -21,8 +21,12 @@ class ExperimentSettings:
                 shutil.copyfile(root_path, settings_file)
         else:
             settings_file = root_path
-        with open(settings_file) as fin:
-            self.settings = yaml.load(fin)
+        # Settings missing from an experiment (e.g. added after it was created) fall back to the defaults
+        with open(root_path) as fin:
+            self.settings = yaml.safe_load(fin)
+        if settings_file != root_path:
+            with open(settings_file) as fin:
+                self.settings.update(yaml.safe_load(fin) or {})
 
     def __getattr__(self, item):
         if item in self.settings:
@@ -0,0 +1,60 @@
+import numpy as np
+
+KEYFRAME_INTERVAL = 100
+
+
+class EpisodeReplay:
+    """Reconstructs any frame of a recorded Episode quickly.
+
+    The grid and the creatures are stored in full every keyframe_interval frames, so getting to a
+    frame takes at most keyframe_interval - 1 frames worth of changes applied to a copy of a keyframe.
+    A frame here is the state after applying all changes up to and including that frame.
+    """
+
+    def __init__(self, episode, world_size, keyframe_interval=KEYFRAME_INTERVAL):
+        self.episode = episode
+        self.size = world_size
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = []
+        grid = np.zeros((world_size, world_size), dtype=np.int64)
+        creatures = {}
+        for idx in range(episode.num_frames):
+            self.apply(idx, grid, creatures)
+            if idx % keyframe_interval == 0:
+                self.keyframes.append((grid.copy(), dict(creatures)))
+
+    def __len__(self):
+        return self.episode.num_frames
+
+    def apply(self, idx, grid, creatures):
+        """Apply the changes of frame idx to grid and creatures, a dict of id -> (energy, type name)."""
+        episode = self.episode
+        rows = slice(episode.grid_offsets[idx], episode.grid_offsets[idx + 1])
+        flat = episode.grid['x'][rows] * self.size + episode.grid['y'][rows]
+        # Only the last change to a cell within a frame counts
+        _, last_reversed = np.unique(flat[::-1], return_index=True)
+        last = len(flat) - 1 - last_reversed
+        grid.flat[flat[last]] = episode.grid['value'][rows][last]
+
+        rows = slice(episode.creature_offsets[idx], episode.creature_offsets[idx + 1])
+        for creature_id, energy, type_index in zip(
+            episode.creatures['id'][rows].tolist(),
+            episode.creatures['energy'][rows].tolist(),
+            episode.creatures['type'][rows].tolist(),
+        ):
+            if energy <= 0:
+                creatures.pop(creature_id, None)
+            elif creature_id in creatures:
+                creatures[creature_id] = (energy, creatures[creature_id][1])
+            else:
+                creatures[creature_id] = (energy, episode.creature_types[type_index] if type_index >= 0 else None)
+
+    def frame(self, idx):
+        """Return (grid, creatures) at frame idx; grid holds MapFeature indices for terrain and ids for creatures."""
+        keyframe = idx // self.keyframe_interval
+        grid, creatures = self.keyframes[keyframe]
+        grid = grid.copy()
+        creatures = dict(creatures)
+        for frame_idx in range(keyframe * self.keyframe_interval + 1, idx + 1):
+            self.apply(frame_idx, grid, creatures)
+        return grid, creatures
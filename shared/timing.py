@@ -0,0 +1,109 @@
+"""Cheap wall clock timing of the phases of a simulation step.
+
+Code marks phases with TIMER.start(name) and TIMER.stop(), or with TIMER.phase(name) as a context
+manager where the overhead does not matter. Phases nest, and time is exclusive: while an inner phase
+runs the outer one is paused, so the totals add up to the time spent in all phases together. When the
+timer is not enabled, start and stop return right away.
+
+The world calls end_step after each step, which keeps the times of the last ROLLING_STEPS steps for
+rolling averages.
+"""
+import cProfile
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+ROLLING_STEPS = 100
+SIDEBAR_PHASES = 5  # Slowest phases shown in the sidebar of the viewer
+
+
+class PhaseTimer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.stack = []  # [name, time the phase was started or resumed] of the open phases
+        self.current = defaultdict(float)  # Time per phase in the step that is running
+        self.recent = deque(maxlen=ROLLING_STEPS)
+
+    def start(self, name):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.stack:
+            outer = self.stack[-1]
+            self.totals[outer[0]] += now - outer[1]
+            self.current[outer[0]] += now - outer[1]
+        self.stack.append([name, now])
+
+    def stop(self):
+        if not self.enabled or not self.stack:
+            return
+        now = time.perf_counter()
+        name, started = self.stack.pop()
+        self.totals[name] += now - started
+        self.current[name] += now - started
+        self.calls[name] += 1
+        if self.stack:
+            self.stack[-1][1] = now
+
+    @contextmanager
+    def phase(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def end_step(self):
+        if not self.enabled:
+            return
+        self.stack = []  # Phases an exception left open would otherwise take the blame for everything after
+        self.recent.append(self.current)
+        self.current = defaultdict(float)
+
+    def rolling(self):
+        """Return {phase: average seconds per step} over the last ROLLING_STEPS steps."""
+        averages = defaultdict(float)
+        for step in self.recent:
+            for name, seconds in step.items():
+                averages[name] += seconds / len(self.recent)
+        return dict(averages)
+
+    def reset(self):
+        self.totals.clear()
+        self.calls.clear()
+        self.stack = []
+        self.current.clear()
+        self.recent.clear()
+
+    def report(self):
+        """Return {phase: {'seconds': total, 'calls': count}} for all phases that ran."""
+        return {name: {'seconds': seconds, 'calls': self.calls[name]} for name, seconds in self.totals.items()}
+
+
+TIMER = PhaseTimer()
+PROFILE_FILE = 'profile.pstats'
+
+
+def slowest(seconds_per_step, count=None):
+    """Return the (phase, seconds) pairs of {phase: seconds per step}, the slowest first, at most count."""
+    return sorted(seconds_per_step.items(), key=lambda item: -item[1])[:count]
+
+
+def format_phases(seconds_per_step):
+    """Format {phase: seconds per step} as milliseconds, the slowest phase first."""
+    return ', '.join(f'{name} {1000 * seconds:.2f}' for name, seconds in slowest(seconds_per_step)) + ' ms/step'
+
+
+@contextmanager
+def profiled(path):
+    """Run the body under cProfile and write the stats to path, to inspect with pstats or snakeviz."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print('Profile written to', path)
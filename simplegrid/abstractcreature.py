@@ -1,8 +1,13 @@
 import abc
+import importlib
 import math
 from enum import IntEnum
 
+import numpy as np
+
 MAX_ENERGY = 1000
+# Modules defining creatures, imported by load_registry so the registry is complete
+CREATURE_MODULES = ('simplegrid.cow', 'simplegrid.wolf', 'simplegrid.deep_cow')
 
 
 class Action(IntEnum):
@@ -31,16 +36,40 @@ class Action(IntEnum):
 
 class AbstractCreature(abc.ABC):
     id_count = 1
+    registry = {}  # All creature classes by name
+    # Creatures that set this get prepare_step called once per world step before any of them steps, and
+    # finish_step once all of them did
+    BATCHED = False
 
     def __init_subclass__(cls, **kwargs):
         if not hasattr(cls, 'COLOR'):
             raise TypeError('Creatures need to declare their color')
+        AbstractCreature.registry[cls.__name__] = cls
+
+    @staticmethod
+    def load_registry():
+        """Import all creature modules so that registry holds every creature class."""
+        for module in CREATURE_MODULES:
+            importlib.import_module(module)
+        return AbstractCreature.registry
 
-    def __init__(self, x, y, settings, energy=None):
+    @staticmethod
+    def creature_class(name):
+        """Return the creature class called name, importing the creature modules if it is not registered yet."""
+        registry = AbstractCreature.registry
+        if name not in registry:
+            registry = AbstractCreature.load_registry()
+        if name not in registry:
+            raise ValueError(f'Unknown creature {name}, expected one of: {", ".join(sorted(registry))}')
+        return registry[name]
+
+    def __init__(self, x, y, settings, energy=None, rng=None):
+        """rng is the numpy Generator of the world, creatures draw all their random numbers from it."""
         self.x = x
         self.y = y
         self.settings = settings
         self.energy = energy or settings.init_energy
+        self.rng = rng or np.random.default_rng()
         self.id = AbstractCreature.id_count
         AbstractCreature.id_count += 1
 
@@ -52,14 +81,33 @@ class AbstractCreature(abc.ABC):
     def step(self, observation):
         pass
 
+    @classmethod
+    def prepare_step(cls, creatures, observations):
+        """Decide for all creatures of this class at once; observations has a row per creature.
+
+        These are the observations at the start of the step, which step then also gets, so batched creatures
+        do not see what creatures that step before them in the same step do, while others do.
+        """
+        pass
+
+    @classmethod
+    def finish_step(cls, creatures):
+        """Called after all creatures of this class stepped and learned."""
+        pass
+
     def learn(self, reward, done):
         pass
 
     def draw(self, display):
-        display.circle(self.x, self.y, math.sqrt(min(0.64, 2 * self.energy / MAX_ENERGY)), self.__class__.COLOR)
+        display.circle(self.x, self.y, self.radius(self.energy), self.__class__.COLOR)
+
+    @staticmethod
+    def radius(energy):
+        """Radius in cells to draw a creature with the given energy."""
+        return math.sqrt(min(0.64, 2 * energy / MAX_ENERGY))
 
     def split(self):
-        new_creature = self.__class__(self.x, self.y, self.settings, self.energy / 2)
+        new_creature = self.__class__(self.x, self.y, self.settings, self.energy / 2, self.rng)
         self.energy /= 2
         return new_creature
 
@@ -1,7 +1,7 @@
-import random
-import operator
+import numpy as np
 
 from simplegrid.abstractcreature import MAX_ENERGY, Action, AbstractCreature
+from simplegrid.direction_kernels import DIRECTIONS, direction_scores, feature_rewards
 from simplegrid.map_feature import MapFeature
 
 
@@ -13,7 +13,7 @@ class SimpleCow(AbstractCreature):
         if self.energy > MAX_ENERGY:
             return Action.SPLIT
 
-        return random.choice(list(Action)[1:-1])
+        return DIRECTIONS[self.rng.integers(len(DIRECTIONS))]
 
 
 class GreedyCow(AbstractCreature):
@@ -30,7 +30,7 @@ class GreedyCow(AbstractCreature):
         interesting_actions = [a for a in possible_actions if observation[a.to_observation(offset)] == -1]
 
         if interesting_actions:
-            return random.choice(interesting_actions)
+            return interesting_actions[self.rng.integers(len(interesting_actions))]
         else:
             return Action.RIGHT  # Was: random.choice(possible_actions)
 
@@ -38,41 +38,18 @@ class GreedyCow(AbstractCreature):
 class SmartCow(SimpleCow):
 
     COLOR = (240, 120, 20)
+    # What seeing a feature anywhere in view is worth and what only counts right next to the cow
+    FEATURE_REWARDS = {MapFeature.GRASS: 1, MapFeature.COW: -0.5}
+    NEAR_FEATURE_REWARDS = {MapFeature.ROCK: -1}
+    REWARDS = feature_rewards(FEATURE_REWARDS)
+    NEAR_REWARDS = feature_rewards(NEAR_FEATURE_REWARDS)
 
     def step(self, observation):
         if self.energy > MAX_ENERGY:
             return Action.SPLIT
 
-        size = observation.shape[0]
-        view_distance = size // 2
-
         # Initial value of a is to favor one direction a little more than others
         # The random is to prevent creature from ending up in an oscillator
-        possible_actions = {a: (a + 2 * random.random()) / 100 for a in list(Action)[1:-1]}
-
-        for col in range(size):
-            x = col - view_distance
-            for row in range(size):
-                y = row - view_distance
-                dist = abs(x) + abs(y)
-                if 0 < dist <= view_distance:
-                    value = observation[col, row]
-                    if value == MapFeature.GRASS.index:
-                        reward = 1
-                    elif dist == 1 and value == MapFeature.ROCK.index:
-                        reward = -1
-                    elif value == MapFeature.COW.index:
-                       reward = -0.5
-                    else:
-                        continue
-                    reward /= dist * dist
-                    if x < 0:
-                        possible_actions[Action.LEFT] += reward
-                    elif x > 0:
-                        possible_actions[Action.RIGHT] += reward
-                    if y < 0:
-                        possible_actions[Action.UP] += reward
-                    elif y > 0:
-                        possible_actions[Action.DOWN] += reward
-        best_action = max(possible_actions.items(), key=operator.itemgetter(1))[0]
-        return best_action
\ No newline at end of file
+        bias = (np.array(DIRECTIONS) + 2 * self.rng.random(len(DIRECTIONS))) / 100
+        scores = direction_scores(observation[None], self.REWARDS, self.NEAR_REWARDS)[0] + bias
+        return DIRECTIONS[np.argmax(scores)]
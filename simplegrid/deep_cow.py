@@ -1,22 +1,39 @@
 import os
+from functools import lru_cache
+
 import numpy as np
 
 from simplegrid.abstractcreature import MAX_ENERGY, Action, AbstractCreature
-from simplegrid.dqn_agent import DQNAgent
 from simplegrid.map_feature import MapFeature
+from simplegrid.numpy_policy import POLICY_FILE, NumpyPolicy
+from simplegrid.population import policy_backend
 
-HISTORY_FILE = 'deep_cow_history.jsonl'
+MEMORY_DIR = 'deep_cow_memory'
 WEIGHTS_FILE = 'deep_cow_model_weights.h5'
 MODEL_FILE = 'deep_cow_model.json'
+# One-hot features of the state, for each cell of the diamond. The third was meant to be water, but has
+# always encoded rock again; it is kept that way so stored models stay valid.
+STATE_FEATURES = np.array([MapFeature.GRASS.index, MapFeature.ROCK.index, MapFeature.ROCK.index, MapFeature.WOLF.index])
+
+
+@lru_cache(maxsize=None)
+def diamond_indices(view_distance):
+    """Flat indices of the visible diamond in a (2 x d + 1, 2 x d + 1) observation, in state order."""
+    if view_distance == 1:
+        return np.array([3, 7, 5, 1])
+    offsets = np.arange(-view_distance, view_distance + 1)
+    distances = np.abs(offsets)[:, None] + np.abs(offsets)[None, :]
+    return np.flatnonzero((distances > 0) & (distances <= view_distance))
 
 
 class DeepCow(AbstractCreature):
     agent = None
     COLOR = (240, 240, 20)
     IS_PREDATOR = False
+    BATCHED = True
 
-    def __init__(self, x, y, settings, energy=None):
-        super().__init__(x, y, settings, energy)
+    def __init__(self, x, y, settings, energy=None, rng=None):
+        super().__init__(x, y, settings, energy, rng)
         self.prev_state = None
         self.prev_reward = None
         self.prev_action_idx = None
@@ -24,6 +41,7 @@ class DeepCow(AbstractCreature):
         self.reward = None
         self.done = None
         self.action_idx = 0
+        self.planned = False  # Whether prepare_step already picked the action for the coming step
 
     @staticmethod
     def to_internal_state(observation):
@@ -34,61 +52,141 @@ class DeepCow(AbstractCreature):
         The center cell is always "us". Only the largest diamond fitting
         the matrix is actually visible.
         """
-        size = observation.shape[0]
+        return DeepCow.to_internal_states(observation[None])[0]
 
-        view_distance = size // 2
-        if view_distance == 1:
-            diamond = observation.flatten()
-            diamond = [diamond[3], diamond[7], diamond[5], diamond[1]]
-        else:
-            diamond = []
-            for x in range(size):
-                for y in range(size):
-                    if 0 < abs(x - size // 2) + abs(y - size // 2) <= view_distance:
-                        diamond.append(observation[x][y])
-        diamond = np.asarray(diamond)
+    @staticmethod
+    def to_internal_states(observations):
+        """to_internal_state for a batch of observations at once, returns an (n, state_size) float32 array."""
+        count, size = len(observations), observations.shape[-1]
+        diamonds = observations.reshape(count, -1)[:, diamond_indices(size // 2)]
+        states = np.empty((count, len(STATE_FEATURES), diamonds.shape[1]), dtype=np.float32)
+        np.equal(diamonds[:, None, :], STATE_FEATURES[None, :, None], out=states)
+        return states.reshape(count, -1)
+
+    @classmethod
+    def prepare_step(cls, creatures, observations):
+        """Pick the actions of all cows that will not split with a single batched prediction.
 
-        grass = MapFeature.GRASS.to_feature_vector(diamond)
-        rock = MapFeature.ROCK.to_feature_vector(diamond)
+        The cows act on these start of step observations, unlike scripted creatures, which see the moves
+        made before their turn in the same step.
+        """
+        hungry = [idx for idx, cow in enumerate(creatures) if cow.energy <= MAX_ENERGY]
+        if not hungry:
+            return
+        states = cls.to_internal_states(np.asarray(observations)[hungry])
+        actions = cls.ensure_agent(creatures[0].settings).act_batch(states, creatures[0].rng)
+        for idx, state, action_idx in zip(hungry, states, actions):
+            cow = creatures[idx]
+            cow.plan(state, int(action_idx))
+            cow.planned = True
 
-        water = MapFeature.ROCK.to_feature_vector(diamond)
-        wolves = MapFeature.WOLF.to_feature_vector(diamond)
-        return np.concatenate((grass, rock, water, wolves))
+    def plan(self, state, action_idx):
+        self.prev_state = self.state
+        self.prev_reward = self.reward
+        self.prev_action_idx = self.action_idx
+        self.state = state
+        self.action_idx = action_idx
 
     def step(self, observation):
         if self.energy > MAX_ENERGY:
             return Action.SPLIT
 
-        self.prev_state = self.state
-        self.prev_reward = self.reward
-        self.prev_action_idx = self.action_idx
-        self.state = self.to_internal_state(observation)
-        if not DeepCow.agent:
-            DeepCow.agent = DQNAgent.from_dimensions(len(self.state), layers=self.settings.layers, action_size=4)
-        self.action_idx = DeepCow.agent.act(self.state)
+        if self.planned:
+            self.planned = False
+        else:
+            state = self.to_internal_state(observation)
+            self.plan(state, DeepCow.ensure_agent(self.settings).act(state, self.rng))
         return Action(self.action_idx + 1)
 
+    @classmethod
+    def finish_step(cls, creatures):
+        """One environment step passed for the training schedule, however many cows remembered something."""
+        if DeepCow.agent:
+            DeepCow.agent.train_step()
+
     def learn(self, reward, done):
         self.reward = reward
         if self.prev_state is not None and self.state is not None:
             DeepCow.agent.remember(self.prev_state, self.prev_action_idx, self.prev_reward, self.state)
-            DeepCow.agent.replay()
         if done:
             DeepCow.agent.remember(self.state, self.action_idx, self.reward, None)
 
+    @staticmethod
+    def state_size(view_distance):
+        """Length of the vectors returned by to_internal_state: four features for each cell of the diamond."""
+        return 4 * 2 * view_distance * (view_distance + 1)
+
+    @staticmethod
+    def agent_options(settings):
+        return {
+            'batch_size': settings.batch_size,
+            'train_every': settings.train_every,
+            'gradient_steps': settings.gradient_steps,
+            'warmup': settings.train_warmup,
+            'prioritized': settings.prioritized_replay,
+            'priority_alpha': settings.priority_alpha,
+            'priority_beta': settings.priority_beta,
+            'seed': settings.seed,
+        }
+
+    @classmethod
+    def ensure_agent(cls, settings, with_memory=True):
+        """Return the agent, restoring it from the experiment or creating a new one the first time."""
+        if not DeepCow.agent:
+            cls.restore_state(settings, with_memory)
+        if not DeepCow.agent:
+            if policy_backend(settings) == 'numpy':
+                raise FileNotFoundError(
+                    f'The numpy policy backend needs a trained policy in {POLICY_FILE}, '
+                    'export one with: python -m simplegrid.numpy_policy <experiment>'
+                )
+            from simplegrid.dqn_agent import DQNAgent  # Imports TensorFlow, which takes seconds
+
+            DeepCow.agent = DQNAgent.from_dimensions(
+                cls.state_size(settings.view_distance),
+                layers=settings.layers,
+                action_size=4,
+                **cls.agent_options(settings),
+            )
+        return DeepCow.agent
+
     @classmethod
-    def restore_state(cls, settings):
+    def restore_state(cls, settings, with_memory=True, backend=None):
+        """Load the agent saved in the experiment, if any; with_memory=False skips its replay memory.
+
+        backend overrides the policy backend the settings ask for.
+        """
+        if (backend or policy_backend(settings)) == 'numpy':
+            policy_file = settings.get_path(POLICY_FILE)
+            if policy_file and os.path.isfile(policy_file):
+                DeepCow.agent = NumpyPolicy.load(policy_file, seed=settings.seed)
+            return
         model_file = settings.get_path(MODEL_FILE)
         if model_file and os.path.isfile(model_file):
-            DeepCow.agent = DQNAgent.from_stored_model(model_file)
+            from simplegrid.dqn_agent import DQNAgent
+
+            DeepCow.agent = DQNAgent.from_stored_model(model_file, **cls.agent_options(settings))
             weights_file = settings.get_path(WEIGHTS_FILE)
             if weights_file and os.path.isfile(weights_file):
                 DeepCow.agent.load_weights(weights_file)
+            memory_dir = settings.get_path(MEMORY_DIR)
+            if with_memory and os.path.isdir(memory_dir):
+                DeepCow.agent.load_memory(memory_dir)
+
+    @classmethod
+    def check_policy(cls, settings):
+        """Raise if the agent was loaded for another policy backend than the settings ask for now."""
+        backend = policy_backend(settings)
+        if DeepCow.agent and isinstance(DeepCow.agent, NumpyPolicy) != (backend == 'numpy'):
+            raise ValueError(
+                f'DeepCow already runs a {type(DeepCow.agent).__name__}, not the {backend} policy asked for now'
+            )
 
     @classmethod
     def save_state(cls, settings):
         weights_file = settings.get_path(WEIGHTS_FILE)
-        if weights_file:
+        if weights_file and not isinstance(cls.agent, NumpyPolicy):  # A numpy policy does not learn
             cls.agent.save_weights(weights_file)
-            cls.agent.save_history(settings.get_path(HISTORY_FILE))
+            cls.agent.save_memory(settings.get_path(MEMORY_DIR))
             cls.agent.save_model(settings.get_path(MODEL_FILE))
+            NumpyPolicy.from_agent(cls.agent).save(settings.get_path(POLICY_FILE))
@@ -0,0 +1,66 @@
+"""Precomputed weights for creatures that score directions by what they see in their observation.
+
+A creature values each visible cell by what is on it, divided by the squared Manhattan distance, and adds
+that value to the horizontal and the vertical direction the cell lies in. Done with kernels this is a
+table lookup followed by a dot product per direction, for one observation or a whole batch at once.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from simplegrid.abstractcreature import Action
+from simplegrid.map_feature import MapFeature
+
+# The directions in the order of the kernels and the scores
+DIRECTIONS = (Action.UP, Action.RIGHT, Action.DOWN, Action.LEFT)
+
+# Smallest MapFeature index, so value - FEATURE_OFFSET indexes the tables returned by feature_rewards
+FEATURE_OFFSET = min(feature.index for feature in MapFeature)
+
+
+@lru_cache(maxsize=None)
+def direction_kernels(view_distance):
+    """Return (kernels, distances) for observations of (2 x d + 1, 2 x d + 1) cells.
+
+    kernels has shape (4, 2 x d + 1, 2 x d + 1) with for UP, RIGHT, DOWN and LEFT, in that order, the
+    weight 1 / dist^2 for the cells of the visible diamond lying in that direction and 0 elsewhere.
+    distances holds the Manhattan distance of each cell to the center.
+    """
+    offsets = np.arange(-view_distance, view_distance + 1)
+    x = offsets[:, None]  # Observations are indexed [x, y]
+    y = offsets[None, :]
+    distances = np.abs(x) + np.abs(y)
+    visible = (distances > 0) & (distances <= view_distance)
+    weights = np.zeros(distances.shape)
+    weights[visible] = 1 / distances[visible] ** 2
+    kernels = np.stack([weights * (y < 0), weights * (x > 0), weights * (y > 0), weights * (x < 0)])
+    for array in kernels, distances:
+        array.setflags(write=False)
+    return kernels, distances
+
+
+def feature_rewards(rewards):
+    """Turn a dict of MapFeature -> reward into an array indexed by feature index - FEATURE_OFFSET."""
+    table = np.zeros(max(feature.index for feature in MapFeature) - FEATURE_OFFSET + 1)
+    for feature, reward in rewards.items():
+        table[feature.index - FEATURE_OFFSET] = reward
+    return table
+
+
+def direction_scores(observations, rewards, near_rewards=None):
+    """Score UP, RIGHT, DOWN and LEFT for a batch of observations.
+
+    Args:
+        observations: (n, 2 x d + 1, 2 x d + 1) array of MapFeature indices
+        rewards: table from feature_rewards with the value of seeing each feature anywhere in view
+        near_rewards: optional table with values that only count directly next to the creature
+
+    Returns:
+        (n, 4) array of scores
+    """
+    kernels, distances = direction_kernels(observations.shape[-1] // 2)
+    features = observations - FEATURE_OFFSET
+    values = rewards[features]
+    if near_rewards is not None:
+        values += (distances == 1) * near_rewards[features]
+    return np.tensordot(values, kernels, axes=((1, 2), (1, 2)))
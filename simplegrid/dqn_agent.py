@@ -1,44 +1,80 @@
 import json
-import random
 import numpy as np
 import os
-from collections import deque
 
 from tensorflow.python.keras.models import Sequential, model_from_json
 from tensorflow.python.keras.layers import Dense
 from tensorflow.python.keras.optimizers import Adam
+from tensorflow.python.framework.random_seed import set_random_seed
+
+from shared.timing import TIMER
+from simplegrid.replay_memory import PrioritizedReplayMemory, ReplayMemory
 
 # Just disables the warning, doesn't enable AVX/FMA
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
+MEMORY_SIZE = 250000
+
 
 class DQNAgent:
-    def __init__(self, model, epsilon):
-        """Create an agent using a model. Typically you want to call either from_stored_model or from_dimensions."""
-        self.memory = deque(maxlen=250000)
+    def __init__(
+        self,
+        model,
+        epsilon,
+        batch_size=64,
+        train_every=1,
+        gradient_steps=1,
+        warmup=0,
+        prioritized=False,
+        priority_alpha=0.6,
+        priority_beta=0.4,
+        seed=None,
+    ):
+        """Create an agent using a model. Typically you want to call either from_stored_model or from_dimensions.
+
+        The training schedule used by train_step is set by batch_size, train_every, gradient_steps and warmup.
+        If prioritized is set, replays sample from a PrioritizedReplayMemory using priority_alpha and
+        priority_beta rather than uniformly. seed seeds the numpy Generator used for exploring and sampling
+        replays; act and act_batch can be given the Generator of the world to use instead.
+        """
         self.gamma = 0.5  # discount rate
         self.epsilon = epsilon
         self.epsilon_min = 0.01
         self.epsilon_decay = 0.995
         self.learning_rate = 0.001
-        self.batch_size = 64
+        self.batch_size = batch_size
+        self.train_every = train_every
+        self.gradient_steps = gradient_steps
+        self.warmup = warmup
+        self.steps_since_training = 0
+        self.learning = True  # Rollout workers only collect memories and leave training to the learner
+        self.rng = np.random.default_rng(seed)
         model.compile(loss='mse', optimizer=Adam(lr=self.learning_rate))
         self.model = model
         self.input_size = int(self.model.input.shape[-1])
-        self.output_size = self.model.output.shape[-1]
+        self.output_size = int(self.model.output.shape[-1])
+        # States are binary feature vectors, so they are stored compactly
+        if prioritized:
+            self.memory = PrioritizedReplayMemory(
+                MEMORY_SIZE, self.input_size, state_dtype=np.uint8, alpha=priority_alpha, beta=priority_beta
+            )
+        else:
+            self.memory = ReplayMemory(MEMORY_SIZE, self.input_size, state_dtype=np.uint8)
 
     @classmethod
-    def from_stored_model(cls, model_file):
+    def from_stored_model(cls, model_file, **kwargs):
         model_and_settings = json.load(open(model_file))
         epsilon = model_and_settings['epsilon']
         model_json = model_and_settings['model']
         model = model_from_json(json.dumps(model_json))
 
-        return cls(model, epsilon)
+        return cls(model, epsilon, **kwargs)
 
     @classmethod
-    def from_dimensions(cls, state_size, layers, action_size):
+    def from_dimensions(cls, state_size, layers, action_size, **kwargs):
         """ Neural Net for Deep-Q learning Model--->>  #Q=NN.predict(state)"""
+        if kwargs.get('seed') is not None:
+            set_random_seed(kwargs['seed'])  # For the initial weights
         model = Sequential()
         # First layer
         model.add(Dense(layers[0], input_dim=state_size, activation='relu'))
@@ -48,7 +84,7 @@ class DQNAgent:
         # Output layer
         model.add(Dense(action_size, activation='linear'))
 
-        return cls(model, epsilon=0.8)
+        return cls(model, epsilon=0.8, **kwargs)
 
     def remember(self, state, action, reward, next_state):
         """Store a memory
@@ -59,24 +95,62 @@ class DQNAgent:
             reward: the reward for the action
             next_state: the resulting state or None if the creature died.
         """
-        self.memory.append((state, action, reward, next_state))
+        self.memory.append(state, action, reward, next_state)
+
+    def remember_batch(self, memories):
+        """Store a batch of memories as returned by take_memories."""
+        self.memory.extend(*memories)
+
+    def take_memories(self):
+        """Return all stored memories as a batch of arrays and clear them, so they can be shipped to another agent."""
+        return self.memory.take_all()
 
-    def act(self, state):
+    def get_weights(self):
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        self.model.set_weights(weights)
+
+    def act(self, state, rng=None):
         """
         Return an action given the state using the internal network.
 
         Args:
             state: flat array containing the state
+            rng: numpy Generator to explore with, defaults to that of the agent
 
         Returns:
             integer indicating the action
 
         """
-        if np.random.rand() <= self.epsilon:
-            return random.randrange(self.output_size)
-        act_values = self.predict(state)
+        rng = rng or self.rng
+        if rng.random() <= self.epsilon:
+            return rng.integers(self.output_size)
+        with TIMER.phase('act'):
+            act_values = self.predict(state)
         return np.argmax(act_values[0])
 
+    def act_batch(self, states, rng=None):
+        """
+        Return actions for a batch of states with a single pass through the network.
+
+        Args:
+            states: (n, input_size) array, one state per row
+            rng: numpy Generator to explore with, defaults to that of the agent
+
+        Returns:
+            integer array with an action per state
+        """
+        states = np.reshape(states, (len(states), -1))
+        rng = rng or self.rng
+        explore = rng.random(len(states)) <= self.epsilon
+        if explore.all():
+            return rng.integers(self.output_size, size=len(states))
+        with TIMER.phase('act'):
+            actions = np.argmax(self.model.predict(states), axis=1)
+        actions[explore] = rng.integers(self.output_size, size=int(explore.sum()))
+        return actions
+
     def predict(self, state):
         state = np.reshape(state, (1, -1))
         return self.model.predict(state)
@@ -85,38 +159,49 @@ class DQNAgent:
         state = np.reshape(state, (1, -1))
         self.model.fit(state, target_f, epochs=1, verbose=0)
 
+    def train_step(self, steps=1):
+        """Account for steps environment steps and replay if the training schedule says so.
+
+        Returns:
+            the average loss of the replays or None if there was no training.
+        """
+        if not self.learning:
+            return None
+        if len(self.memory) < self.warmup:
+            self.steps_since_training = 0
+            return None
+        self.steps_since_training += steps
+        rounds, self.steps_since_training = divmod(self.steps_since_training, self.train_every)
+        if not rounds:
+            return None
+        replays = rounds * self.gradient_steps
+        return sum(self.replay() for _ in range(replays)) / replays
+
     def replay(self):
-        # Sample a batch from memory uniformly at random
-        batch_size = min(self.batch_size, len(self.memory))
-        batch = random.sample(self.memory, batch_size)
-
-        # Predict q_values in batches for efficiency
-        none_state = np.zeros(self.input_size)  # Used in place of None for next_state
-        states = np.array([sample[0] for sample in batch])
-        next_states = np.array([(none_state if sample[3] is None else sample[3]) for sample in batch])
-        q_values = self.model.predict(states)
-        q_values_next = self.model.predict(next_states)
-
-        loss = 0.0
-
-        # Fill in our training batch
-        X = np.zeros((batch_size, self.input_size))
-        y = np.zeros((batch_size, self.output_size))
-        for i in range(batch_size):
-            state, action, reward, next_state = batch[i]
+        if not self.memory:
+            return None
+        with TIMER.phase('replay'):
+            # Sample a batch from memory, uniformly at random unless the memory is prioritized
+            batch_size = min(self.batch_size, len(self.memory))
+            indices, weights = self.memory.sample(batch_size, self.rng)
+            states, actions, rewards, next_states, dones = self.memory.batch(indices)
+            states = states.astype(np.float32)
+
+            # Predict q_values in batches for efficiency
+            q_values = self.model.predict(states)
+            q_values_next = self.model.predict(next_states.astype(np.float32))
+
             # Important : target is the q_value itself for all actions except the one actually taken
-            if next_state is not None:
-                reward += self.gamma * np.amax(q_values_next[i])
-            target = q_values[i]
-            loss += abs(target[action] - reward)
-            target[action] = reward
-            X[i] = state
-            y[i] = target
+            targets = rewards + self.gamma * np.amax(q_values_next, axis=1) * ~dones
+            rows = np.arange(batch_size)
+            errors = np.abs(q_values[rows, actions] - targets)
+            self.memory.update_priorities(indices, errors)
+            q_values[rows, actions] = targets
 
-        self.model.fit(X, y, verbose=0)
-        self.epsilon = min(self.epsilon_decay * self.epsilon, self.epsilon_min)
+            self.model.fit(states, q_values, sample_weight=weights, verbose=0)
+            self.epsilon = min(self.epsilon_decay * self.epsilon, self.epsilon_min)
 
-        return loss / batch_size
+        return np.mean(errors)
 
     def identity_test(self):
         """Run the network over inputs with each exactly one cell set to one."""
@@ -137,15 +222,11 @@ class DQNAgent:
     def save_weights(self, name):
         self.model.save_weights(name)
 
-    def save_history(self, name):
-        with open(name, 'w') as fout:
-            for state, action, reward, next_state in self.memory:
-                if next_state is not None:  # Added but not sure why this was not needed in the first place
-                    state = [float(x) for x in state]
-                    if next is not None:
-                        next_state = [float(x) for x in next_state]
-                    record = {'state': state, 'action': int(action), 'reward': float(reward), 'next_state': next_state}
-                    fout.write(json.dumps(record) + '\n')
+    def save_memory(self, directory):
+        self.memory.save(directory)
+
+    def load_memory(self, directory):
+        self.memory.load(directory)
 
     def save_model(self, name):
         model_json = json.loads(self.model.to_json(indent=2))
@@ -0,0 +1,153 @@
+import numpy as np
+
+MAX_TRIES = 64  # Random cells SparseFreeCells tries before it looks through all cells for a free one
+
+
+def new_free_cells(settings):
+    """Create the free-cell index that suits the grid mode: sparse for chunked grids, dense otherwise."""
+    if settings.grid == 'chunked':
+        return SparseFreeCells(settings.world_size)
+    return FreeCells(settings.world_size)
+
+
+class FreeCells:
+    """The free cells of a square grid, with O(1) add, remove and picking a random one.
+
+    Cells are stored as flat indices x * size + y at the start of cells in no particular order, with
+    positions[cell] the place of a cell in cells or -1 if it is not free. Removing a cell moves the last
+    one into its place, so there are never gaps to skip over. Both are int32 arrays to keep huge worlds
+    affordable.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.cells = np.zeros(size * size, dtype=np.int32)
+        self.positions = np.full(size * size, -1, dtype=np.int32)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, xy):
+        x, y = xy
+        return self.positions[x * self.size + y] >= 0
+
+    def add(self, x, y):
+        cell = x * self.size + y
+        if self.positions[cell] < 0:
+            self.positions[cell] = self.count
+            self.cells[self.count] = cell
+            self.count += 1
+
+    def discard(self, x, y):
+        cell = x * self.size + y
+        position = self.positions[cell]
+        if position >= 0:
+            self.count -= 1
+            last = self.cells[self.count]
+            self.cells[position] = last
+            self.positions[last] = position
+            self.positions[cell] = -1
+
+    def add_all(self, cells):
+        """Add an array of distinct flat indices x * size + y at once, skipping those already free."""
+        cells = cells[self.positions[cells] < 0]
+        end = self.count + len(cells)
+        self.cells[self.count : end] = cells
+        self.positions[cells] = np.arange(self.count, end)
+        self.count = end
+
+    def discard_all(self, cells):
+        """Remove an array of distinct flat indices at once, skipping those that are not free."""
+        cells = cells[self.positions[cells] >= 0]
+        end = self.count - len(cells)
+        holes = self.positions[cells]
+        self.positions[cells] = -1
+        # The cells that stay but sit past the new end fill the places of removed ones before it
+        tail = self.cells[end : self.count]
+        tail = tail[self.positions[tail] >= 0]
+        holes = holes[holes < end]
+        self.cells[holes] = tail
+        self.positions[tail] = holes
+        self.count = end
+
+    def free(self):
+        """Return the flat indices of the free cells, a view that changes with the next update."""
+        return self.cells[: self.count]
+
+    def random(self, rng):
+        """Return a random free (x, y) picked with the numpy Generator rng or None if there are none."""
+        if not self.count:
+            return None
+        return divmod(int(self.cells[rng.integers(self.count)]), self.size)
+
+    def reset(self, free):
+        """Rebuild from a (size, size) boolean array that is True for the free cells."""
+        cells = np.flatnonzero(free)
+        self.count = len(cells)
+        self.cells[: self.count] = cells
+        self.positions.fill(-1)
+        self.positions[cells] = np.arange(self.count)
+
+    def reset_taken(self, taken):
+        """Rebuild with all cells free except those with the flat indices in taken."""
+        free = np.ones(self.size * self.size, dtype=bool)
+        free[taken] = False
+        self.reset(free)
+
+
+class SparseFreeCells:
+    """The free cells of a huge, mostly empty grid, with the interface of FreeCells except free.
+
+    Only the cells that are not free are stored, so memory grows with what is on the grid rather than its
+    area. A random free cell is found by trying random cells, which is quick as long as most are free;
+    after MAX_TRIES misses it picks one of the free cells by counting through the sorted taken cells.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.taken = set()
+
+    def __len__(self):
+        return self.size * self.size - len(self.taken)
+
+    @property
+    def count(self):
+        return len(self)
+
+    def __contains__(self, xy):
+        x, y = xy
+        return x * self.size + y not in self.taken
+
+    def add(self, x, y):
+        self.taken.discard(x * self.size + y)
+
+    def discard(self, x, y):
+        self.taken.add(x * self.size + y)
+
+    def add_all(self, cells):
+        self.taken.difference_update(cells.tolist())
+
+    def discard_all(self, cells):
+        self.taken.update(cells.tolist())
+
+    def random(self, rng):
+        """Return a random free (x, y) picked with the numpy Generator rng or None if there are none."""
+        count = len(self)
+        if not count:
+            return None
+        for cell in rng.integers(self.size * self.size, size=MAX_TRIES).tolist():
+            if cell not in self.taken:
+                return divmod(cell, self.size)
+        # The nth free cell is n plus the number of taken cells before it, and taken[i] - i free cells
+        # come before taken cell i
+        taken = np.sort(np.fromiter(self.taken, dtype=np.int64, count=len(self.taken)))
+        nth = int(rng.integers(count))
+        cell = nth + int(np.searchsorted(taken - np.arange(len(taken)), nth, side='right'))
+        return divmod(cell, self.size)
+
+    def reset(self, free):
+        self.taken = set(np.flatnonzero(~np.asarray(free)).tolist())
+
+    def reset_taken(self, taken):
+        self.taken = set(np.asarray(taken).tolist())
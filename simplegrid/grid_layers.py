@@ -0,0 +1,141 @@
+"""Storage for the per cell layers of the world grid.
+
+By default a layer is a plain (size, size) numpy array. With the setting grid: chunked a layer is a
+ChunkedLayer instead, which only allocates the chunk_size x chunk_size chunks that were ever written to,
+so huge mostly empty worlds only take memory where something is going on. That needs the terrain to be
+sparse as well: random terrain at the usual start fractions lands in every chunk.
+"""
+import numpy as np
+
+GRID_MODES = ('dense', 'chunked')
+SCALARS = (int, np.integer)
+
+
+def new_layer(settings, dtype, default=0):
+    """Create a (world_size, world_size) layer filled with default, stored as the settings ask for."""
+    if settings.grid not in GRID_MODES:
+        raise ValueError(f'Unknown grid mode {settings.grid}, use one of {", ".join(GRID_MODES)}')
+    if settings.grid == 'chunked':
+        return ChunkedLayer(settings.world_size, dtype, default, settings.chunk_size)
+    return np.full((settings.world_size, settings.world_size), default, dtype=dtype)
+
+
+def blocks(layer, x_lo, y_lo, x_hi, y_hi):
+    """Yield (x, y, values) blocks that cover the cells from (x_lo, y_lo) up to (x_hi, y_hi) of a layer.
+
+    values holds the cells from (x, y) on and may stick out of the window. A ChunkedLayer leaves out the
+    chunks that were never written, whose cells all have the default value.
+    """
+    if isinstance(layer, ChunkedLayer):
+        yield from layer.blocks(x_lo, y_lo, x_hi, y_hi)
+    elif x_lo < x_hi and y_lo < y_hi:
+        yield x_lo, y_lo, layer[x_lo:x_hi, y_lo:y_hi]
+
+
+def count_cells(layer, value):
+    """Return the number of cells of a layer that hold value, without making a dense copy of a ChunkedLayer."""
+    if isinstance(layer, ChunkedLayer):
+        return layer.count(value)
+    return int(np.count_nonzero(layer == value))
+
+
+class ChunkedLayer:
+    """A square grid that allocates its chunks on first write.
+
+    Supports the bits of the numpy interface the world uses: indexing with a pair of scalars or integer
+    arrays to read and write, fill and np.asarray. Allocated chunks live in storage, and table has for
+    each chunk its index in storage. Index 0 is a shared chunk of default values that is never written,
+    so a read is a single gather, allocated or not.
+    """
+
+    def __init__(self, size, dtype, default=0, chunk_size=256):
+        self.size = size
+        self.shape = (size, size)
+        self.dtype = np.dtype(dtype)
+        self.default = default
+        self.chunk_size = chunk_size
+        num_chunks = -(-size // chunk_size)
+        self.table = np.zeros((num_chunks, num_chunks), dtype=np.int32)
+        self.storage = np.full((1, chunk_size, chunk_size), default, dtype=self.dtype)
+        self.num_allocated = 1
+
+    @property
+    def nbytes(self):
+        return self.storage[: self.num_allocated].nbytes + self.table.nbytes
+
+    def locate(self, key):
+        xs, ys = key
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=np.intp), np.asarray(ys, dtype=np.intp))
+        return xs // self.chunk_size, ys // self.chunk_size, xs % self.chunk_size, ys % self.chunk_size
+
+    def __getitem__(self, key):
+        x, y = key
+        if isinstance(x, SCALARS) and isinstance(y, SCALARS):  # Most reads are of single cells, skip the arrays
+            cx, x = divmod(x, self.chunk_size)
+            cy, y = divmod(y, self.chunk_size)
+            return self.storage[self.table[cx, cy], x, y]
+        cxs, cys, xs, ys = self.locate(key)
+        return self.storage[self.table[cxs, cys], xs, ys]
+
+    def __setitem__(self, key, value):
+        x, y = key
+        if isinstance(x, SCALARS) and isinstance(y, SCALARS):
+            cx, x = divmod(x, self.chunk_size)
+            cy, y = divmod(y, self.chunk_size)
+            chunk = self.table[cx, cy]
+            if chunk == 0:
+                self.allocate(np.array([cx]), np.array([cy]))
+                chunk = self.table[cx, cy]
+            self.storage[chunk, x, y] = value
+            return
+        cxs, cys, xs, ys = self.locate(key)
+        chunks = self.table[cxs, cys]
+        missing = chunks == 0
+        if missing.any():
+            self.allocate(cxs[missing], cys[missing])
+            chunks = self.table[cxs, cys]
+        self.storage[chunks, xs, ys] = value
+
+    def allocate(self, cxs, cys):
+        """Give the chunks at (cxs, cys) their own storage, filled with the default value."""
+        new_chunks = np.unique(np.ravel_multi_index((cxs, cys), self.table.shape))
+        count = self.num_allocated + len(new_chunks)
+        if count > len(self.storage):
+            grown = np.empty((max(count, 2 * len(self.storage)), self.chunk_size, self.chunk_size), self.dtype)
+            grown[: self.num_allocated] = self.storage[: self.num_allocated]
+            self.storage = grown
+        self.storage[self.num_allocated : count] = self.default
+        self.table.flat[new_chunks] = np.arange(self.num_allocated, count)
+        self.num_allocated = count
+
+    def fill(self, value):
+        if value == self.default:
+            self.table.fill(0)
+            self.storage = self.storage[:1].copy()
+            self.num_allocated = 1
+        else:
+            self.allocate(*np.nonzero(self.table == 0))
+            self.storage[1:] = value
+
+    def blocks(self, x_lo, y_lo, x_hi, y_hi):
+        """Yield (x, y, chunk) for the allocated chunks that overlap the window, see blocks."""
+        size = self.chunk_size
+        cx_lo, cy_lo = max(0, x_lo // size), max(0, y_lo // size)
+        cx_hi, cy_hi = -(-min(x_hi, self.size) // size), -(-min(y_hi, self.size) // size)
+        window = self.table[cx_lo:cx_hi, cy_lo:cy_hi]
+        for cx, cy in zip(*np.nonzero(window)):
+            x, y = (cx_lo + cx) * size, (cy_lo + cy) * size
+            yield x, y, self.storage[window[cx, cy], : self.size - x, : self.size - y]
+
+    def count(self, value):
+        counted, unallocated = 0, self.size ** 2
+        for _, _, chunk in self.blocks(0, 0, self.size, self.size):
+            counted += np.count_nonzero(chunk == value)
+            unallocated -= chunk.size
+        return int(counted + (unallocated if value == self.default else 0))
+
+    def __array__(self, dtype=None):
+        num_chunks = len(self.table)
+        dense = self.storage[self.table].transpose(0, 2, 1, 3)
+        dense = dense.reshape(num_chunks * self.chunk_size, num_chunks * self.chunk_size)[: self.size, : self.size]
+        return dense if dtype is None else dense.astype(dtype)
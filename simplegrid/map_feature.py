@@ -32,6 +32,19 @@ class MapFeature(Enum):
         text_scene = text_scene.strip()
         return np.asarray([[cls.from_char(char).index for char in line] for line in text_scene.split('\n')]).T
 
+    @classmethod
+    def color_table(cls):
+        """Return (colors, offset) such that colors[value - offset] is the RGB color of a cell with that value.
+
+        Creatures are drawn separately, so their cells get the color of an empty cell.
+        """
+        offset = min(feature.index for feature in cls)
+        colors = np.zeros((max(feature.index for feature in cls) - offset + 1, 3), dtype=np.uint8)
+        for feature in cls:
+            if feature.index < 0:
+                colors[feature.index - offset] = feature.color
+        return colors, offset
+
     def __int__(self):
         return self.value
 
@@ -0,0 +1,133 @@
+"""Run a trained DQNAgent network in plain numpy, without TensorFlow.
+
+The networks are small stacks of dense layers, so a forward pass is a few matrix products; doing those in
+numpy avoids both the TensorFlow import and the per call overhead of model.predict. DeepCow saves the
+policy next to the Keras model whenever it saves its state. To export an existing experiment:
+
+    python -m simplegrid.numpy_policy experiments/my_experiment
+"""
+import sys
+
+import numpy as np
+
+from shared.timing import TIMER
+
+POLICY_FILE = 'deep_cow_policy.npz'
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def linear(x):
+    return x
+
+
+ACTIVATIONS = {'relu': relu, 'linear': linear}
+
+
+class NumpyPolicy:
+    """Stand-in for a DQNAgent that acts like it, but does not learn.
+
+    weights and biases hold the kernel and bias of each dense layer and activations the names of their
+    activation functions, as in Keras. remember, train_step and replay are accepted and do nothing.
+    """
+
+    def __init__(self, weights, biases, activations, epsilon=0.0, seed=None):
+        unknown = set(activations) - set(ACTIVATIONS)
+        if unknown:
+            raise ValueError(f'Unsupported activations: {", ".join(sorted(unknown))}')
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        self.epsilon = epsilon
+        self.learning = False
+        self.rng = np.random.default_rng(seed)
+        self.input_size = self.weights[0].shape[0]
+        self.output_size = self.weights[-1].shape[1]
+
+    @classmethod
+    def from_agent(cls, agent, **kwargs):
+        """Copy the network of a DQNAgent."""
+        weights, biases, activations = [], [], []
+        for layer in agent.model.layers:
+            kernel, bias = layer.get_weights()
+            weights.append(kernel)
+            biases.append(bias)
+            activations.append(layer.get_config()['activation'])
+        kwargs.setdefault('epsilon', agent.epsilon)
+        return cls(weights, biases, activations, **kwargs)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        with np.load(path) as archive:
+            num_layers = len(archive['activations'])
+            weights = [archive[f'weights_{idx}'] for idx in range(num_layers)]
+            biases = [archive[f'biases_{idx}'] for idx in range(num_layers)]
+            activations = archive['activations'].tolist()
+            kwargs.setdefault('epsilon', float(archive['epsilon']))
+        return cls(weights, biases, activations, **kwargs)
+
+    def save(self, path):
+        arrays = {f'weights_{idx}': w for idx, w in enumerate(self.weights)}
+        arrays.update({f'biases_{idx}': b for idx, b in enumerate(self.biases)})
+        np.savez(path, activations=np.asarray(self.activations, dtype=str), epsilon=self.epsilon, **arrays)
+
+    def predict(self, states):
+        """Return the Q values for a batch of states, or for a single flat state as a batch of one."""
+        values = np.asarray(states, dtype=np.float32).reshape(-1, self.input_size)
+        for weights, biases, activation in zip(self.weights, self.biases, self.activations):
+            values = ACTIVATIONS[activation](values @ weights + biases)
+        return values
+
+    def act(self, state, rng=None):
+        rng = rng or self.rng
+        if rng.random() <= self.epsilon:
+            return rng.integers(self.output_size)
+        with TIMER.phase('act'):
+            return np.argmax(self.predict(state)[0])
+
+    def act_batch(self, states, rng=None):
+        rng = rng or self.rng
+        explore = rng.random(len(states)) <= self.epsilon
+        with TIMER.phase('act'):
+            actions = np.argmax(self.predict(states), axis=1)
+        actions[explore] = rng.integers(self.output_size, size=int(explore.sum()))
+        return actions
+
+    def remember(self, state, action, reward, next_state):
+        pass
+
+    def remember_batch(self, memories):
+        pass
+
+    def train_step(self, steps=1):
+        return None
+
+    def replay(self):
+        return None
+
+    def identity_test(self):
+        """Run the network over inputs with each exactly one cell set to one."""
+        return self.predict(np.identity(self.input_size))
+
+    def show_weights(self):
+        for idx, (weights, biases) in enumerate(zip(self.weights, self.biases)):
+            print(f'\nLayer {idx} weights (rows are inputs, columns are outputs:')
+            print(weights)
+            print(f'Layer {idx} biases:')
+            print(biases)
+        print()
+
+
+if __name__ == '__main__':
+    # Export the Keras model of an experiment, e.g.: python -m simplegrid.numpy_policy experiments/my_experiment
+    from shared.experiment_settings import ExperimentSettings
+    from simplegrid.deep_cow import DeepCow
+
+    experiment_settings = ExperimentSettings(sys.argv[1])
+    DeepCow.restore_state(experiment_settings, backend='keras')
+    if DeepCow.agent is None:
+        sys.exit('No trained model found in ' + sys.argv[1])
+    NumpyPolicy.from_agent(DeepCow.agent).save(experiment_settings.get_path(POLICY_FILE))
+    print('Policy written to', experiment_settings.get_path(POLICY_FILE))
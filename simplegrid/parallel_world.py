@@ -0,0 +1,78 @@
+"""VectorWorld that spreads the decisions of its creatures over worker processes.
+
+The world is cut into square tiles and the creatures of each tile decide in a worker. A creature only
+sees view_distance cells around it and moves at most one, so a worker reads no more than its tile plus a
+halo of view_distance + 1 cells. Workers read the grid straight from shared memory, so only the creatures
+of a tile and their random numbers travel between processes.
+
+All random numbers are drawn in the parent, and moves, attacks and splits are still resolved there in
+order of birth, so the outcome is exactly that of a VectorWorld with the same seed, whatever the number
+of workers and however creatures on the borders of tiles interact.
+"""
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+from shared.timing import TIMER
+from simplegrid.vector_world import VectorWorld, decide
+from simplegrid.world import window_indices
+
+TILES_PER_WORKER = 4  # More tiles than workers evens out the load when creatures bunch up
+MIN_PARALLEL = 2000  # Below this many creatures the work is not worth shipping to other processes
+
+_shared = {}  # The grid as seen by a worker process, set up by _init_worker
+
+
+def _init_worker(raw_kinds, size, view_distance):
+    _shared['kinds'] = np.frombuffer(raw_kinds, dtype=np.int8).reshape(size, size)
+    _shared['size'] = size
+    _shared['view_distance'] = view_distance
+
+
+def decide_tile(xs, ys, species, energies, draws):
+    """Return the actions of the creatures of one tile, runs in a worker."""
+    observations = _shared['kinds'][window_indices(_shared['size'], _shared['view_distance'], xs, ys)]
+    return decide(observations, species, energies, draws)
+
+
+class ParallelVectorWorld(VectorWorld):
+    """VectorWorld whose creatures decide in num_workers processes, tile by tile. Call close when done."""
+
+    def __init__(self, settings, population=None, num_workers=None):
+        super().__init__(settings, population)
+        num_workers = num_workers or os.cpu_count()
+        self.raw_kinds = multiprocessing.RawArray('b', self.size * self.size)
+        self.kinds = np.frombuffer(self.raw_kinds, dtype=np.int8).reshape(self.size, self.size)
+        self.tiles_per_side = math.ceil(math.sqrt(num_workers * TILES_PER_WORKER))
+        context = multiprocessing.get_context('spawn')
+        self.pool = context.Pool(
+            num_workers, initializer=_init_worker, initargs=(self.raw_kinds, self.size, settings.view_distance)
+        )
+
+    def tiles(self):
+        """Return for each tile with creatures in it the rows of those creatures."""
+        tile_ids = (self.xs * self.tiles_per_side // self.size) * self.tiles_per_side
+        tile_ids += self.ys * self.tiles_per_side // self.size
+        order = np.argsort(tile_ids, kind='stable')
+        bounds = np.flatnonzero(np.diff(tile_ids[order])) + 1
+        return np.split(order, bounds)
+
+    def decide_all(self, draws):
+        if len(self.species) < MIN_PARALLEL:
+            return super().decide_all(draws)
+        tiles = self.tiles()
+        with TIMER.phase('policy'):  # Observations are gathered in the workers too
+            arguments = [
+                (self.xs[rows], self.ys[rows], self.species[rows], self.energies[rows], draws[rows]) for rows in tiles
+            ]
+            results = self.pool.starmap(decide_tile, arguments)
+            actions = np.empty(len(self.species), dtype=np.intp)
+            for rows, tile_actions in zip(tiles, results):
+                actions[rows] = tile_actions
+        return actions
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,65 @@
+"""Which creatures a world starts with and when its episodes end, as set in settings.yaml."""
+from collections import Counter
+
+from simplegrid.abstractcreature import AbstractCreature
+
+END_CONDITIONS = ('last_species', 'extinction', 'steps')
+POLICY_BACKENDS = ('keras', 'numpy')
+
+
+def resolve_population(settings):
+    """Return the creatures to start with as [(creature class, count)] from settings.population.
+
+    Without a population, there are start_num_creatures SmartCows and DeepCows each and start_num_wolves
+    Wolves. Only creature classes with a shared agent can have a policy, see policy_backend.
+    """
+    registry = AbstractCreature.load_registry()
+    if settings.population is None:
+        return [
+            (registry['SmartCow'], settings.start_num_creatures),
+            (registry['DeepCow'], settings.start_num_creatures),
+            (registry['Wolf'], settings.start_num_wolves),
+        ]
+    population = []
+    for entry in settings.population:
+        creature_class = AbstractCreature.creature_class(entry['creature'])
+        if 'policy' in entry:
+            if not hasattr(creature_class, 'agent'):
+                raise ValueError(f'{creature_class.__name__} has no policy to set')
+        population.append((creature_class, int(entry.get('count', 1))))
+    return population
+
+
+def policy_backend(settings):
+    """Return the policy backend of the agent: the policy population entries set, or else policy_backend."""
+    policies = {entry['policy'] for entry in settings.population or () if 'policy' in entry}
+    if len(policies) > 1:
+        raise ValueError(f'All DeepCows share one agent, but the population asks for {" and ".join(sorted(policies))}')
+    backend = policies.pop() if policies else settings.policy_backend
+    if backend not in POLICY_BACKENDS:
+        raise ValueError(f'Unknown policy backend {backend}, expected one of: {", ".join(POLICY_BACKENDS)}')
+    return backend
+
+
+def population_counts(population):
+    """Sum [(creature class, count)] into a Counter, for entries naming the same class more than once."""
+    counts = Counter()
+    for creature_class, count in population:
+        counts[creature_class] += count
+    return counts
+
+
+def episode_over(settings, counts, start_species):
+    """Whether an episode ends early, given the number of living prey per class name in counts.
+
+    start_species is the number of prey species the episode started with. With end_condition last_species
+    it ends once one of them is left, or none when there was only one, with extinction when all prey died
+    and with steps only after steps_per_episode.
+    """
+    if settings.end_condition == 'last_species':
+        return len(counts) < min(2, start_species)
+    if settings.end_condition == 'extinction':
+        return not counts
+    if settings.end_condition == 'steps':
+        return False
+    raise ValueError(f'Unknown end_condition {settings.end_condition}, expected one of: {", ".join(END_CONDITIONS)}')
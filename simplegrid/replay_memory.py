@@ -0,0 +1,260 @@
+import json
+import os
+
+import numpy as np
+
+FIELDS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+META_FILE = 'memory.json'
+MIN_PRIORITY = 1e-6  # Keeps importance sampling weights finite, whatever the errors or epsilon
+
+
+class ReplayMemory:
+    """Ring buffer of (state, action, reward, next_state) transitions stored in preallocated numpy arrays.
+
+    Once full, new transitions overwrite the oldest ones. Transitions that ended the life of the creature
+    have no next state; they are flagged in dones and get an all zero next state.
+
+    A memory can be saved to a directory with a .npy file per field. Saving again only writes the
+    transitions added since, and ReplayMemory.open maps a saved memory without reading it into RAM.
+    """
+
+    def __init__(self, capacity, state_size, state_dtype=np.float32):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=state_dtype)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_size), dtype=state_dtype)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.position = 0  # Where the next transition goes
+        self.size = 0
+        self.saved_to = None  # Directory that matches this memory except for the last unsaved transitions
+        self.unsaved = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, state, action, reward, next_state):
+        idx = self.position
+        self.states[idx] = state
+        self.actions[idx] = action
+        self.rewards[idx] = reward
+        if next_state is None:
+            self.next_states[idx] = 0
+            self.dones[idx] = True
+        else:
+            self.next_states[idx] = next_state
+            self.dones[idx] = False
+        self.advance(1)
+
+    def extend(self, states, actions, rewards, next_states, dones):
+        """Append a batch of transitions given as arrays, as returned by take_all."""
+        count = len(actions)
+        if count > self.capacity:
+            states, actions, rewards, next_states, dones = (
+                field[-self.capacity :] for field in (states, actions, rewards, next_states, dones)
+            )
+            count = self.capacity
+        indices = (self.position + np.arange(count)) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        self.advance(count)
+
+    def advance(self, count):
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+        self.unsaved += count
+
+    def ordered_indices(self):
+        """Indices of the stored transitions from oldest to newest."""
+        return (self.position - self.size + np.arange(self.size)) % self.capacity
+
+    def sample(self, batch_size, rng):
+        """Pick batch_size random transitions using the numpy Generator rng.
+
+        Returns:
+            (indices, weights) where weights are the importance sampling weights to train with or None
+        """
+        return rng.integers(self.size, size=batch_size), None
+
+    def update_priorities(self, indices, errors):
+        """Report the training errors of sampled transitions. Uniform sampling ignores these."""
+        pass
+
+    def batch(self, indices):
+        """Return (states, actions, rewards, next_states, dones) arrays for the given indices."""
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+        )
+
+    def take_all(self):
+        """Return all transitions oldest first as a batch and empty the memory."""
+        batch = self.batch(self.ordered_indices())
+        self.clear()
+        return batch
+
+    def clear(self):
+        self.position = 0
+        self.size = 0
+        self.saved_to = None
+        self.unsaved = 0
+
+    def save(self, directory):
+        """Write the memory to directory, only writing what changed if it was saved there before."""
+        if self.saved_to != directory or not os.path.isfile(os.path.join(directory, META_FILE)):
+            os.makedirs(directory, exist_ok=True)
+            for field in FIELDS:
+                np.save(os.path.join(directory, field + '.npy'), getattr(self, field))
+        elif self.unsaved:
+            count = min(self.unsaved, self.capacity)
+            indices = (self.position - count + np.arange(count)) % self.capacity
+            for field in FIELDS:
+                saved = np.load(os.path.join(directory, field + '.npy'), mmap_mode='r+')
+                saved[indices] = getattr(self, field)[indices]
+                saved.flush()
+                del saved
+        with open(os.path.join(directory, META_FILE), 'w') as fout:
+            json.dump({'position': self.position, 'size': self.size}, fout)
+        self.saved_to = directory
+        self.unsaved = 0
+
+    @classmethod
+    def open(cls, directory, mode='r'):
+        """Return a plain ReplayMemory backed by the memory mapped files of a saved memory.
+
+        Nothing is read until it is used, so this is a cheap way to train offline on a big memory.
+        Use mode 'r+' or 'c' to allow changes, written back to the files or kept in memory respectively.
+        """
+        with open(os.path.join(directory, META_FILE)) as fin:
+            meta = json.load(fin)
+        memory = ReplayMemory.__new__(ReplayMemory)
+        for field in FIELDS:
+            setattr(memory, field, np.load(os.path.join(directory, field + '.npy'), mmap_mode=mode))
+        memory.capacity = len(memory.actions)
+        memory.position = meta['position']
+        memory.size = meta['size']
+        memory.saved_to = directory if mode == 'r+' else None
+        memory.unsaved = 0
+        return memory
+
+    def load(self, directory):
+        """Replace the contents of this memory with those saved in directory."""
+        saved = ReplayMemory.open(directory)
+        self.clear()
+        if saved.capacity == self.capacity and saved.states.shape == self.states.shape:
+            for field in FIELDS:
+                getattr(self, field)[:] = getattr(saved, field)
+            self.position = saved.position
+            self.size = saved.size
+            self.saved_to = directory
+        else:
+            self.extend(*saved.batch(saved.ordered_indices()))
+            self.unsaved = 0
+
+    def __iter__(self):
+        """Iterate over the transitions oldest first as (state, action, reward, next_state) tuples."""
+        for idx in self.ordered_indices():
+            next_state = None if self.dones[idx] else self.next_states[idx]
+            yield self.states[idx], self.actions[idx], self.rewards[idx], next_state
+
+
+class SumTree:
+    """Binary tree stored in an array where each node holds the sum of its two children.
+
+    Node 1 is the root and the leaves start at self.leaves, so both updating a leaf and finding the leaf
+    where a prefix sum falls take O(log n). Both operations work on arrays of indices at once.
+    """
+
+    def __init__(self, capacity):
+        self.leaves = max(2, 1 << (capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[indices + self.leaves]
+
+    def update(self, indices, values):
+        nodes = np.asarray(indices) + self.leaves
+        self.tree[nodes] = values
+        while True:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+            if nodes[0] == 1:
+                break
+
+    def find(self, prefix_sums):
+        """Return for each prefix sum the index of the leaf in which it falls."""
+        nodes = np.ones(len(prefix_sums), dtype=np.intp)
+        prefix_sums = np.array(prefix_sums, dtype=np.float64)
+        while nodes[0] < self.leaves:
+            left = 2 * nodes
+            go_right = prefix_sums > self.tree[left]
+            prefix_sums -= go_right * self.tree[left]
+            nodes = left + go_right
+        return nodes - self.leaves
+
+    def clear(self):
+        self.tree.fill(0)
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """Replay memory that samples transitions in proportion to their last training error.
+
+    Priorities are (|error| + epsilon) ** alpha, but at least MIN_PRIORITY, and new transitions get the
+    highest priority seen so far, so each is sampled at least about once. The bias this introduces is
+    corrected by importance sampling weights (n * p) ** -beta, normalized to a maximum of 1.
+    """
+
+    def __init__(self, capacity, state_size, state_dtype=np.float32, alpha=0.6, beta=0.4, epsilon=0.01):
+        super().__init__(capacity, state_size, state_dtype)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.priorities = SumTree(capacity)
+        self.max_priority = 1.0
+
+    def append(self, state, action, reward, next_state):
+        idx = self.position
+        super().append(state, action, reward, next_state)
+        self.priorities.update([idx], self.max_priority)
+
+    def extend(self, states, actions, rewards, next_states, dones):
+        indices = (self.position + np.arange(min(len(actions), self.capacity))) % self.capacity
+        super().extend(states, actions, rewards, next_states, dones)
+        self.priorities.update(indices, self.max_priority)
+
+    def sample(self, batch_size, rng):
+        total = self.priorities.total()
+        if not total > 0:
+            return super().sample(batch_size, rng)
+        # Stratified: one sample from each of batch_size equal slices of the total priority
+        prefix_sums = (np.arange(batch_size) + rng.random(batch_size)) * total / batch_size
+        indices = np.minimum(self.priorities.find(prefix_sums), self.size - 1)
+        probabilities = np.maximum(self.priorities[indices], MIN_PRIORITY) / total
+        weights = (self.size * probabilities) ** -self.beta
+        return indices, weights / weights.max()
+
+    def update_priorities(self, indices, errors):
+        priorities = np.maximum((np.abs(errors) + self.epsilon) ** self.alpha, MIN_PRIORITY)
+        priorities[np.isnan(priorities)] = self.max_priority
+        self.priorities.update(indices, priorities)
+        self.max_priority = max(self.max_priority, priorities.max())
+
+    def clear(self):
+        super().clear()
+        self.priorities.clear()
+        self.max_priority = 1.0
+
+    def load(self, directory):
+        super().load(directory)
+        self.priorities.clear()
+        if self.size:
+            self.priorities.update(self.ordered_indices(), self.max_priority)
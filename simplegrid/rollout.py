@@ -0,0 +1,135 @@
+"""Collect DeepCow experience in several worlds in parallel and train a single shared agent on it.
+
+Every worker process runs its own World. Its DeepCows act with a local copy of the network but do not
+train; their memories are shipped in batches to the learner, which owns the DQNAgent that does the
+replays and periodically broadcasts its weights and epsilon back to the workers, so they explore as
+little as the learner does.
+"""
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from simplegrid.deep_cow import DeepCow
+from simplegrid.population import policy_backend
+from simplegrid.world import World
+
+SEND_EVERY = 50  # World steps between shipping memories to the learner
+BROADCAST_EVERY = 20  # Batches received by the learner between sending weights to the workers
+SAVE_EVERY = 600  # Seconds between saving the learner's state
+REPORT_EVERY = 10  # Seconds between progress reports
+QUEUE_TIMEOUT = 1
+
+
+def rollout_worker(experiment, seed, transitions, weights, stop):
+    """Run episodes in a private World, shipping DeepCow memories and picking up new weights as they come."""
+    settings = ExperimentSettings(experiment)
+    world = World(settings, seed)
+    # Only the learner replays, and memories loaded here would all be shipped back to it
+    agent = DeepCow.ensure_agent(settings, with_memory=False)
+    agent.learning = False
+    steps = 0  # World steps since memories were last shipped, which drive the learner's training schedule
+    try:
+        while not stop.is_set():
+            world.reset(Episode())
+            running = True
+            while running and not stop.is_set():
+                running = world.step()
+                steps += 1
+                if world.steps % SEND_EVERY == 0 or not running:
+                    if _ship(agent.take_memories(), steps, transitions, stop):
+                        steps = 0
+                    _pick_up_weights(agent, weights)
+    except KeyboardInterrupt:
+        pass
+
+
+def _ship(memories, steps, transitions, stop):
+    """Send memories with the number of steps they took to the learner, returns whether anything was sent."""
+    if not len(memories[1]):
+        return False
+    while not stop.is_set():
+        try:
+            transitions.put((memories, steps), timeout=QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _pick_up_weights(agent, weights):
+    """Take the latest (weights, epsilon) the learner sent, if any."""
+    latest = None
+    while True:
+        try:
+            latest = weights.get_nowait()
+        except queue.Empty:
+            break
+    if latest is not None:
+        agent.set_weights(latest[0])
+        agent.epsilon = latest[1]
+
+
+def train(settings, num_workers):
+    """Train the DeepCow agent on experience from num_workers worlds until interrupted."""
+    if policy_backend(settings) != 'keras':
+        raise ValueError('Training needs the keras policy backend, a numpy policy does not learn')
+    DeepCow.restore_state(settings)
+    agent = DeepCow.ensure_agent(settings)
+
+    context = multiprocessing.get_context('spawn')  # TensorFlow does not survive a fork
+    transitions = context.Queue(maxsize=4 * num_workers)
+    stop = context.Event()
+    weight_queues = [context.Queue() for _ in range(num_workers)]
+    # Independent streams of random numbers for the workers, that are still repeatable with a seed
+    seeds = np.random.SeedSequence(settings.seed).spawn(num_workers)
+    workers = [
+        context.Process(target=rollout_worker, args=(settings.path, seed, transitions, weights, stop), daemon=True)
+        for seed, weights in zip(seeds, weight_queues)
+    ]
+    for weights in weight_queues:
+        weights.put((agent.get_weights(), agent.epsilon))
+    for worker in workers:
+        worker.start()
+
+    batches = 0
+    received = 0
+    start = last_report = last_save = time.perf_counter()
+    try:
+        while True:
+            try:
+                memories, steps = transitions.get(timeout=QUEUE_TIMEOUT)
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in workers):
+                    raise RuntimeError('All rollout workers died')
+                continue
+            count = len(memories[1])
+            agent.remember_batch(memories)
+            agent.train_step(steps)
+            batches += 1
+            received += count
+
+            if batches % BROADCAST_EVERY == 0:
+                weights = (agent.get_weights(), agent.epsilon)
+                for weight_queue in weight_queues:
+                    weight_queue.put(weights)
+
+            now = time.perf_counter()
+            if now - last_report > REPORT_EVERY:
+                print(f'{received} transitions from {num_workers} workers, {received / (now - start):.0f}/s')
+                last_report = now
+            if now - last_save > SAVE_EVERY:
+                DeepCow.save_state(settings)
+                last_save = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=5 * QUEUE_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+        DeepCow.save_state(settings)
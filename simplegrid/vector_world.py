@@ -0,0 +1,268 @@
+from collections import Counter
+
+import numpy as np
+
+from shared.timing import TIMER
+from simplegrid.abstractcreature import MAX_ENERGY, Action
+from simplegrid.cow import SimpleCow, SmartCow
+from simplegrid.direction_kernels import direction_scores
+from simplegrid.free_cells import FreeCells
+from simplegrid.map_feature import MapFeature
+from simplegrid.population import episode_over, population_counts, resolve_population
+from simplegrid.wolf import WOLF_MOVE_SPEED, Wolf
+from simplegrid.world import window_indices
+
+SPECIES = (SimpleCow, SmartCow, Wolf)
+SIMPLE_COW, SMART_COW, WOLF = range(len(SPECIES))
+# (dx, dy) for each Action, NONE and SPLIT stay put
+DIRECTIONS = np.array([(0, 0)] + [Action(a).to_direction() for a in range(Action.UP, Action.LEFT + 1)] + [(0, 0)])
+NUM_DRAWS = 5  # Uniform random numbers per creature per step, see decide
+PREDATORS = np.array([species.is_predator() for species in SPECIES])
+# What the creatures of each species look like in observations
+MARKERS = np.where(PREDATORS, MapFeature.WOLF.index, MapFeature.COW.index).astype(np.int8)
+REWARDS = [getattr(species, 'REWARDS', None) for species in SPECIES]
+NEAR_REWARDS = [getattr(species, 'NEAR_REWARDS', None) for species in SPECIES]
+
+
+def decide(observations, species, energies, draws):
+    """Return the Action of every creature, as SimpleCow, SmartCow and Wolf would pick them one by one.
+
+    draws holds NUM_DRAWS uniform random numbers per creature: the first decides whether a wolf moves
+    at all, the others add the random preference for UP, RIGHT, DOWN and LEFT respectively.
+    """
+    actions = np.zeros(len(species), dtype=np.intp)
+    scores = np.zeros((len(species), 4))
+    for idx in (SMART_COW, WOLF):
+        members = species == idx
+        if members.any():
+            scores[members] = direction_scores(observations[members], REWARDS[idx], NEAR_REWARDS[idx])
+
+    smart = species == SMART_COW
+    # The small preference per direction keeps smart cows out of oscillations, see SmartCow.step
+    bias = (np.arange(Action.UP, Action.LEFT + 1) + 2 * draws[:, 1:]) / 100
+    actions[smart] = np.argmax(scores[smart] + bias[smart], axis=1) + Action.UP
+
+    wolves = species == WOLF
+    chase = np.argmax(scores[wolves] + 0.1 * draws[wolves, 1:], axis=1) + Action.UP
+    actions[wolves] = np.where(draws[wolves, 0] > WOLF_MOVE_SPEED, Action.NONE, chase)
+
+    simple = species == SIMPLE_COW
+    actions[simple] = (draws[simple, 1] * 4).astype(np.intp) + Action.UP
+
+    actions[~PREDATORS[species] & (energies > MAX_ENERGY)] = Action.SPLIT
+    return actions
+
+
+class VectorWorld:
+    """World for SimpleCows, SmartCows and Wolves that keeps creatures in arrays and steps them all at once.
+
+    Creatures are rows of xs, ys, energies and species (an index into SPECIES), in order of birth; kinds
+    and occupants are grids with what creatures observe and the row of the creature in each cell.
+
+    Unlike World, where each creature sees the moves of the ones before it, all creatures decide on the
+    world as it was at the start of the step. Conflicts are resolved in order of birth: first the attacks
+    of wolves, then of all creatures moving or splitting into the same cell only the oldest succeeds.
+    Cells vacated in a step only become available in the next. A split puts the offspring on the free
+    neighbouring cell that was found, where World puts it on top of its parent. Episodes are not recorded.
+    """
+
+    def __init__(self, settings, population=None):
+        """population maps creature classes from SPECIES to how many to start with, by default as in settings.
+
+        Without a population setting there are start_num_creatures SmartCows, as DeepCows are not supported.
+        """
+        self.settings = settings
+        self.size = settings.world_size
+        if population is None:
+            if settings.population is None:
+                population = {SmartCow: settings.start_num_creatures, Wolf: settings.start_num_wolves}
+            else:
+                population = population_counts(resolve_population(settings))
+        unsupported = [creature_class.__name__ for creature_class in population if creature_class not in SPECIES]
+        if unsupported:
+            raise ValueError(f'VectorWorld does not support {", ".join(unsupported)}')
+        self.population = population
+        self.rng = np.random.default_rng(settings.seed)
+        self.kinds = np.zeros((self.size, self.size), dtype=np.int8)
+        self.occupants = np.full((self.size, self.size), -1, dtype=np.int32)
+        self.free_cells = FreeCells(self.size)  # Empty cells, kept in sync by place and clear
+        no_rows = np.zeros(0, dtype=np.intp)
+        self.set_creatures(no_rows, no_rows, np.zeros(0), np.zeros(0, dtype=np.int8))
+        self.counts = Counter()
+        self.steps = 0
+        self.num_creatures_born = 0
+        self.num_creatures_eaten = 0
+
+    def set_creatures(self, xs, ys, energies, species):
+        self.xs = xs
+        self.ys = ys
+        self.energies = energies
+        self.species = species
+
+    def reset(self, episode=None, grass_fraction=None, rock_fraction=None, water_fraction=None):
+        """Start a new episode. The episode is accepted for compatibility with World, but nothing is recorded."""
+        if grass_fraction is None:
+            grass_fraction = self.settings.start_grass_fraction
+        if rock_fraction is None:
+            rock_fraction = self.settings.start_rock_fraction
+        if water_fraction is None:
+            water_fraction = self.settings.start_water_fraction
+        self.kinds.fill(0)
+        self.occupants.fill(-1)
+        self.steps = 0
+        self.num_creatures_born = 0
+        self.num_creatures_eaten = 0
+        c = self.size * self.size
+        grass_count = int(c * grass_fraction)
+        rock_count = int(c * rock_fraction)
+        water_count = int(c * water_fraction)
+        chosen = self.rng.choice(c, grass_count + rock_count + water_count, replace=False)
+        # Same split as World.reset, which hands grass one cell extra
+        self.kinds.flat[chosen[: grass_count + 1]] = MapFeature.GRASS.index
+        self.kinds.flat[chosen[grass_count + 1 : grass_count + rock_count + 1]] = MapFeature.ROCK.index
+        self.kinds.flat[chosen[grass_count + rock_count + 1 :]] = MapFeature.WATER.index
+        self.free_cells.reset(self.kinds == MapFeature.EMPTY.index)
+
+        species = np.repeat(
+            [SPECIES.index(creature_class) for creature_class in self.population], list(self.population.values())
+        ).astype(np.int8)
+        cells = self.rng.choice(self.free_cells.free(), len(species), replace=False)
+        energies = np.full(len(species), self.settings.init_energy, dtype=float)
+        self.set_creatures(cells // self.size, cells % self.size, energies, species)
+        self.place(np.arange(len(species)))
+        self.count()
+        self.start_species = len(self.counts)
+
+    def end(self, show_weights=False):
+        pass
+
+    def close(self):
+        pass
+
+    def place(self, indices):
+        """Mark the creatures with the given rows on the grids at their current positions."""
+        xs, ys = self.xs[indices], self.ys[indices]
+        self.kinds[xs, ys] = MARKERS[self.species[indices]]
+        self.occupants[xs, ys] = indices
+        self.free_cells.discard_all(xs * self.size + ys)
+
+    def clear(self, xs, ys):
+        self.kinds[xs, ys] = MapFeature.EMPTY.index
+        self.occupants[xs, ys] = -1
+        self.free_cells.add_all(np.unique(xs * self.size + ys))
+
+    def get_observations(self):
+        return self.kinds[window_indices(self.size, self.settings.view_distance, self.xs, self.ys)]
+
+    def decide_all(self, draws):
+        """Return the actions of all creatures in this step, given their NUM_DRAWS random numbers each."""
+        TIMER.start('observation')
+        observations = self.get_observations()
+        TIMER.stop()
+        with TIMER.phase('policy'):
+            return decide(observations, self.species, self.energies, draws)
+
+    def step(self):
+        self.steps += 1
+        if self.steps == self.settings.steps_per_episode:
+            return False
+        settings = self.settings
+        count = len(self.species)
+        predator = PREDATORS[self.species]
+        self.energies[predator] = MAX_ENERGY
+
+        actions = self.decide_all(self.rng.random((count, NUM_DRAWS)))
+        TIMER.start('action')
+        moving = (actions >= Action.UP) & (actions <= Action.LEFT)
+        self.energies[actions == Action.NONE] -= settings.idle_cost
+        self.energies[moving] -= settings.move_cost
+        target_xs = (self.xs + DIRECTIONS[actions, 0]) % self.size
+        target_ys = (self.ys + DIRECTIONS[actions, 1]) % self.size
+        target_kinds = self.kinds[target_xs, target_ys]
+
+        # Attacks are rare, so these are resolved one by one
+        dead = np.zeros(count, dtype=bool)
+        new_xs = self.xs.copy()
+        new_ys = self.ys.copy()
+        for idx in np.flatnonzero(moving & predator & (self.occupants[target_xs, target_ys] >= 0)):
+            victim = self.occupants[target_xs[idx], target_ys[idx]]
+            if not dead[idx] and not dead[victim]:
+                dead[victim] = True
+                new_xs[idx] = target_xs[idx]
+                new_ys[idx] = target_ys[idx]
+                self.num_creatures_eaten += 1
+
+        # Claims on free cells by moves and splits; the oldest claimant of a cell gets it
+        passable = (target_kinds == MapFeature.GRASS.index) | (target_kinds == MapFeature.EMPTY.index)
+        movers = np.flatnonzero(moving & passable & ~dead)
+        splitters = np.flatnonzero((actions == Action.SPLIT) & ~dead)
+        options = np.argsort(self.rng.random((len(splitters), 4)), axis=1) + Action.UP
+        option_xs = (self.xs[splitters, None] + DIRECTIONS[options, 0]) % self.size
+        option_ys = (self.ys[splitters, None] + DIRECTIONS[options, 1]) % self.size
+        empty = self.kinds[option_xs, option_ys] == MapFeature.EMPTY.index
+        choice = np.argmax(empty, axis=1)
+        has_room = empty.any(axis=1)
+        splitters = splitters[has_room]
+        rows = np.arange(len(choice))[has_room]
+        child_xs = option_xs[rows, choice[has_room]]
+        child_ys = option_ys[rows, choice[has_room]]
+
+        claimants = np.concatenate((movers, splitters))
+        claimed_xs = np.concatenate((target_xs[movers], child_xs))
+        claimed_ys = np.concatenate((target_ys[movers], child_ys))
+        claimed = claimed_xs * self.size + claimed_ys
+        order = np.argsort(claimants, kind='stable')
+        _, first = np.unique(claimed[order], return_index=True)
+        won = np.zeros(len(claimants), dtype=bool)
+        won[order[first]] = True
+        won_split = won[len(movers) :]
+        movers = movers[won[: len(movers)]]
+        splitters = splitters[won_split]
+        child_xs = child_xs[won_split]
+        child_ys = child_ys[won_split]
+
+        new_xs[movers] = target_xs[movers]
+        new_ys[movers] = target_ys[movers]
+        grazing = movers[~predator[movers] & (target_kinds[movers] == MapFeature.GRASS.index)]
+        self.energies[grazing] += settings.grass_energy
+        self.energies[moving & (target_kinds == MapFeature.WATER.index)] = 0
+        self.energies[splitters] /= 2
+        dead |= ~predator & (self.energies < settings.min_energy)
+
+        moved = (new_xs != self.xs) | (new_ys != self.ys)
+        self.clear(self.xs[moved | dead], self.ys[moved | dead])
+        self.xs, self.ys = new_xs, new_ys
+        self.clear(self.xs[dead], self.ys[dead])
+
+        survivors = ~dead
+        self.set_creatures(
+            np.concatenate((self.xs[survivors], child_xs)),
+            np.concatenate((self.ys[survivors], child_ys)),
+            np.concatenate((self.energies[survivors], self.energies[splitters])),
+            np.concatenate((self.species[survivors], self.species[splitters])),
+        )
+        self.num_creatures_born += len(splitters)
+        self.place(np.arange(len(self.species)))
+        TIMER.stop()
+
+        # Watching grass grow
+        TIMER.start('grass')
+        turns, rest = divmod(settings.grass_grow_per_turn, 1)
+        if self.rng.random() < rest:  # To make it possible to grow a fraction per turn
+            turns += 1
+        grown = self.rng.choice(self.free_cells.free(), min(int(turns), len(self.free_cells)), replace=False)
+        self.free_cells.discard_all(grown)
+        self.kinds.flat[grown] = MapFeature.GRASS.index
+        TIMER.stop()
+        TIMER.end_step()
+
+        self.count()
+        return not episode_over(self.settings, self.counts, self.start_species)
+
+    def count(self):
+        """Count the prey by class name, like World does."""
+        counts = np.bincount(self.species[~PREDATORS[self.species]], minlength=len(SPECIES))
+        self.counts = Counter({species.__name__: int(count) for species, count in zip(SPECIES, counts) if count})
+
+    def get_info(self):
+        return ' '.join(k + ': ' + str(v) for k, v in self.counts.items())
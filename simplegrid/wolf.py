@@ -1,7 +1,7 @@
-import random
-import operator
+import numpy as np
 
 from simplegrid.abstractcreature import MAX_ENERGY, Action, AbstractCreature
+from simplegrid.direction_kernels import DIRECTIONS, direction_scores, feature_rewards
 from simplegrid.map_feature import MapFeature
 
 WOLF_MOVE_SPEED = 0.5
@@ -10,6 +10,9 @@ WOLF_MOVE_SPEED = 0.5
 class Wolf(AbstractCreature):
 
     COLOR = (101, 67, 33)
+    # What seeing a feature anywhere in view is worth
+    FEATURE_REWARDS = {MapFeature.ROCK: -1, MapFeature.WATER: -100, MapFeature.COW: 10, MapFeature.WOLF: -100}
+    REWARDS = feature_rewards(FEATURE_REWARDS)
 
     @staticmethod
     def is_predator():
@@ -18,38 +21,8 @@ class Wolf(AbstractCreature):
     def step(self, observation):
         self.energy = MAX_ENERGY
 
-        if random.random() > WOLF_MOVE_SPEED:
+        if self.rng.random() > WOLF_MOVE_SPEED:
             return Action.NONE
 
-        size = observation.shape[0]
-        view_distance = size // 2
-        possible_actions = {a: random.random() * 0.1 for a in list(Action)[1:-1]}
-
-        for col in range(size):
-            x = col - view_distance
-            for row in range(size):
-                y = row - view_distance
-                dist = abs(x) + abs(y)
-                value = observation[col, row]
-                if 0 < dist <= view_distance:
-                    if value == MapFeature.ROCK.index:
-                        reward = -1
-                    elif value == MapFeature.WATER.index:
-                        reward = -100
-                    elif value == MapFeature.COW.index:
-                        reward = 10
-                    elif value == MapFeature.WOLF.index:
-                        reward = -100
-                    else:
-                        continue
-                    reward /= dist * dist
-                    if x < 0:
-                        possible_actions[Action.LEFT] += reward
-                    elif x > 0:
-                        possible_actions[Action.RIGHT] += reward
-                    if y < 0:
-                        possible_actions[Action.UP] += reward
-                    elif y > 0:
-                        possible_actions[Action.DOWN] += reward
-        best_action = max(possible_actions.items(), key=operator.itemgetter(1))[0]
-        return best_action
+        scores = direction_scores(observation[None], self.REWARDS)[0] + self.rng.random(len(DIRECTIONS)) * 0.1
+        return DIRECTIONS[np.argmax(scores)]
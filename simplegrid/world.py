@@ -1,33 +1,51 @@
 #!/usr/bin/env python
-import os
-import random
 from collections import Counter, defaultdict, deque
 
 import numpy as np
 
-from simplegrid.cow import SmartCow
+from shared.timing import SIDEBAR_PHASES, TIMER, slowest
 from simplegrid.abstractcreature import Action
 from simplegrid.deep_cow import DeepCow
-from simplegrid.wolf import Wolf
+from simplegrid.free_cells import new_free_cells
+from simplegrid.grid_layers import blocks, count_cells, new_layer
 from simplegrid.map_feature import MapFeature
+from simplegrid.population import episode_over, resolve_population
+
+NO_SLOT = -1
+
+
+def window_indices(size, view_distance, xs, ys):
+    """Return toroidal index arrays selecting the view window around each (x, y) pair.
+
+    The result has shape (n, 2 x d + 1, 2 x d + 1) when indexing a (size, size) grid, wrapping around the
+    edges of the world instead of rolling the whole grid.
+    """
+    offsets = np.arange(-view_distance, view_distance + 1)
+    xs = (np.asarray(xs, dtype=np.intp)[:, None, None] + offsets[None, :, None]) % size
+    ys = (np.asarray(ys, dtype=np.intp)[:, None, None] + offsets[None, None, :]) % size
+    return xs, ys
 
 
 class World:
-    def __init__(self, settings, display):
+    def __init__(self, settings, seed=None):
+        """seed overrides the seed setting, e.g. to give parallel worlds their own streams of random numbers."""
         self.counts = {}
-        display.offset_x = 0
-        display.offset_y = 0
-        if settings.path:
-            display.sidebar[os.path.basename(os.path.normpath(settings.path))] = ''
-
         self.creatures = {}
         self.energies = {}
         self.settings = settings
         self.size = settings.world_size
-        self.cells = np.zeros((self.size, self.size))
+        # All randomness of the world and its creatures comes from here, so a seed makes runs repeatable
+        self.rng = np.random.default_rng(settings.seed if seed is None else seed)
+        # What is in each cell as a MapFeature index, with creatures as MapFeature.COW/WOLF, which is also
+        # what creatures observe. Which creature it is is in occupants, as its slot in self.slots.
+        self.kinds = new_layer(settings, np.int8, MapFeature.EMPTY.index)
+        self.occupants = new_layer(settings, np.int32, NO_SLOT)
+        self.slots = []  # Creature in each slot, or None; slots are reused so occupants stays small
+        self.free_slots = []
+        self.slot_of = {}  # Creature id -> slot
+        self.free_cells = new_free_cells(settings)  # Empty cells, kept in sync by set_cell
         self.steps = 0
         self.winstreak = deque(maxlen=9)
-        DeepCow.restore_state(settings)
 
     def reset(self, episode, grass_fraction=None, rock_fraction=None, water_fraction=None):
         if grass_fraction is None:
@@ -39,7 +57,11 @@ class World:
         self.counts = {}
         self.episode = episode
         self.creatures = {}
-        self.cells.fill(0)
+        self.kinds.fill(MapFeature.EMPTY.index)
+        self.occupants.fill(NO_SLOT)
+        self.slots = []
+        self.free_slots = []
+        self.slot_of = {}
         self.steps = 0
         self.num_creatures_born = 0
         self.num_creatures_eaten = 0
@@ -47,66 +69,99 @@ class World:
         grass_count = int(c * grass_fraction)
         rock_count = int(c * rock_fraction)
         water_count = int(c * water_fraction)
-        for idx_choice, idx_val in enumerate(
-            np.random.choice(c, grass_count + rock_count + water_count, replace=False)
-        ):
-            # todo: dit kan netter, zeker als we mog meer types krijgen
-            if idx_choice <= grass_count:
-                celltype = MapFeature.GRASS
-            elif idx_choice <= grass_count + rock_count:
-                celltype = MapFeature.ROCK
-            else:
-                celltype = MapFeature.WATER
-            self.set_cell(idx_val // self.size, idx_val % self.size, celltype.index)
-
-        for _ in range(self.settings.start_num_creatures):
-            x, y = self.free_spot()
-            self.add_new_creature(SmartCow(x, y, self.settings))
-            x, y = self.free_spot()
-            self.add_new_creature(DeepCow(x, y, self.settings))
-        for _ in range(self.settings.start_num_wolves):
-            x, y = self.free_spot()
-            self.add_new_creature(Wolf(x, y, self.settings))
+        # Set the whole terrain at once, huge worlds have millions of cells
+        xs, ys = np.divmod(self.rng.choice(c, grass_count + rock_count + water_count, replace=False), self.size)
+        terrain = np.full(len(xs), MapFeature.WATER.index, dtype=np.int8)
+        terrain[: grass_count + 1] = MapFeature.GRASS.index
+        terrain[grass_count + 1 : grass_count + rock_count + 1] = MapFeature.ROCK.index
+        self.kinds[xs, ys] = terrain
+        self.free_cells.reset_taken(xs * self.size + ys)
+        for x, y, value in zip(xs.tolist(), ys.tolist(), terrain.tolist()):
+            self.episode.grid_change(x, y, value)
+
+        DeepCow.check_policy(self.settings)
+        for creature_class, count in resolve_population(self.settings):
+            for _ in range(count):
+                spot = self.free_spot()
+                if spot is None:
+                    break
+                self.add_new_creature(creature_class(*spot, self.settings, rng=self.rng))
+        self.count()
+        self.start_species = len(self.counts)
 
     def end(self, show_weights=False):
         self.episode.save(self.settings)
-        DeepCow.save_state(self.settings)
-        print('deep-cow-loss:', DeepCow.agent.replay())
-        if show_weights:
-            DeepCow.agent.show_weights()
+        if DeepCow.agent:  # Only once a DeepCow has acted
+            DeepCow.save_state(self.settings)
+            print('deep-cow-loss:', DeepCow.agent.replay())
+            if show_weights:
+                DeepCow.agent.show_weights()
 
     def set_cell(self, x, y, value):
-        self.cells[x, y] = value
+        """Put a MapFeature index or the id of a creature in the cell at x, y."""
+        self.kinds[x, y] = self.kind_of(value)
+        self.occupants[x, y] = self.slot_of[value] if value > 0 else NO_SLOT
+        if value == 0:
+            self.free_cells.add(x, y)
+        else:
+            self.free_cells.discard(x, y)
         self.episode.grid_change(x, y, value)
 
+    def kind_of(self, value):
+        """Map a cell value to what creatures observe: terrain stays as is, creature ids become COW or WOLF."""
+        if value > 0:
+            return MapFeature.WOLF.index if self.creatures[value].is_predator() else MapFeature.COW.index
+        return value
+
+    def load_environment(self, x, y, environment):
+        """Paste a block of MapFeature indices (e.g. from text_scene_to_environment) with its corner at x, y."""
+        w, h = environment.shape
+        xs, ys = np.mgrid[x : x + w, y : y + h]
+        self.kinds[xs, ys] = environment
+        self.occupants[xs, ys] = NO_SLOT
+        cells = (xs * self.size + ys).ravel()
+        empty = np.ravel(environment) == MapFeature.EMPTY.index
+        self.free_cells.add_all(cells[empty])
+        self.free_cells.discard_all(cells[~empty])
+
     def free_spot(self):
-        while True:
-            x = random.randrange(self.size)
-            y = random.randrange(self.size)
-            if self.cells[x, y] == 0:
-                return x, y
+        """Return a random empty (x, y) or None if the world is full."""
+        return self.free_cells.random(self.rng)
 
     def add_new_creature(self, creature):
         self.creatures[creature.id] = creature
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slots[slot] = creature
+        else:
+            slot = len(self.slots)
+            self.slots.append(creature)
+        self.slot_of[creature.id] = slot
         self.episode.creature_change(creature.id, creature.energy, type(creature).__name__)
         self.set_cell(creature.x, creature.y, creature.id)
 
+    def remove_creature(self, creature):
+        self.set_cell(creature.x, creature.y, 0)
+        del self.creatures[creature.id]
+        slot = self.slot_of.pop(creature.id)
+        self.slots[slot] = None
+        self.free_slots.append(slot)
+
+    def creature_at(self, x, y):
+        """Return the creature in the cell at x, y or None."""
+        slot = self.occupants[x, y]
+        return None if slot == NO_SLOT else self.slots[slot]
+
+    def window_indices(self, xs, ys):
+        return window_indices(self.size, self.settings.view_distance, xs, ys)
+
     def get_observation(self, creature):
-        size_2 = self.size // 2
-        rolled = np.roll(self.cells, (size_2 - creature.x, size_2 - creature.y), (0, 1))
-        view_distance = self.settings.view_distance
-        observation = rolled[
-            size_2 - view_distance : size_2 + view_distance + 1, size_2 - view_distance : size_2 + view_distance + 1
-        ]
-        for x in range(observation.shape[0]):
-            for y in range(observation.shape[1]):
-                if observation[x, y] > 0:
-                    observation[x, y] = (
-                        MapFeature.WOLF.value
-                        if self.creatures[observation[x, y]].is_predator()
-                        else MapFeature.COW.value
-                    )
-        return observation
+        return self.get_observations([creature])[0]
+
+    def get_observations(self, creatures):
+        """Return the observations of all creatures at once as an (n, 2 x d + 1, 2 x d + 1) array."""
+        xs, ys = self.window_indices([c.x for c in creatures], [c.y for c in creatures])
+        return self.kinds[xs, ys]
 
     def step(self):
         self.steps += 1
@@ -115,16 +170,41 @@ class World:
         dead = set()
         born = []
         self.energies = defaultdict(int)
+
+        batched = defaultdict(list)
+        for creature in self.creatures.values():
+            if creature.BATCHED:
+                batched[type(creature)].append(creature)
+        prepared = {}  # Creature id -> the observation batched creatures already decided on
+        for creature_class, creatures in batched.items():
+            TIMER.start('observation')
+            observations = self.get_observations(creatures)
+            TIMER.stop()
+            TIMER.start('policy')
+            creature_class.prepare_step(creatures, observations)
+            TIMER.stop()
+            prepared.update(zip((creature.id for creature in creatures), observations))
+
         for creature in self.creatures.values():
             if creature.id in dead:
                 continue
 
-            observation = self.get_observation(creature)
+            observation = prepared.get(creature.id)
+            if observation is None:
+                TIMER.start('observation')
+                observation = self.get_observation(creature)
+                TIMER.stop()
+            TIMER.start('policy')
             action = creature.step(observation)
+            TIMER.stop()
+            TIMER.start('action')
             new_creature, reward, done, victims = self.process_action(creature, action)
+            TIMER.stop()
             dead.update(victims)
             self.num_creatures_eaten += len(victims)
+            TIMER.start('learning')
             creature.learn(reward, done)
+            TIMER.stop()
 
             if done:
                 dead.add(creature)
@@ -133,34 +213,46 @@ class World:
 
             self.energies[creature.__class__.__name__] += creature.energy
 
-        for creature in dead:
-            self.set_cell(creature.x, creature.y, 0)
-            del self.creatures[creature.id]
+        TIMER.start('learning')
+        for creature_class, creatures in batched.items():
+            creature_class.finish_step(creatures)
+        TIMER.stop()
+
+        TIMER.start('action')
+        for creature in sorted(dead, key=lambda creature: creature.id):  # Sets of creatures have no fixed order
+            self.remove_creature(creature)
 
         self.num_creatures_born += len(born)
         for creature in born:
             self.add_new_creature(creature)
+        TIMER.stop()
 
         # Watching grass grow
+        TIMER.start('grass')
         turns, rest = divmod(self.settings.grass_grow_per_turn, 1)
-        a = random.random()
-        if a < rest:  # To make it possible to grow a fraction per turn
+        if self.rng.random() < rest:  # To make it possible to grow a fraction per turn
             turns += 1
         for _ in range(int(turns)):
-            x = random.randrange(self.size)
-            y = random.randrange(self.size)
-            if self.cells[x, y] == 0:
-                self.set_cell(x, y, MapFeature.GRASS.index)
+            spot = self.free_spot()
+            if spot is None:
+                break
+            self.set_cell(*spot, MapFeature.GRASS.index)
+        TIMER.stop()
 
         self.episode.next_frame()
-        self.counts = Counter(
-            creature.__class__.__name__ for creature in self.creatures.values() if not creature.is_predator()
-        )
+        TIMER.end_step()
+        self.count()
 
-        if not len(self.counts) == 2:
+        if episode_over(self.settings, self.counts, self.start_species):
             return self.end_of_episode()
         return True
 
+    def count(self):
+        """Count the prey by class name."""
+        self.counts = Counter(
+            creature.__class__.__name__ for creature in self.creatures.values() if not creature.is_predator()
+        )
+
     def end_of_episode(self):
         if len(self.counts) == 0:
             print('draw')
@@ -172,16 +264,17 @@ class World:
         return False
 
     def draw(self, display):
-        grass_count = 0
-        for x in range(self.size):
-            for y in range(self.size):
-                idx = self.cells[x, y]
-                if idx < 0:
-                    display.rectangle(x, y, 1, MapFeature(idx).color, padding=0.1)
-                    if idx == MapFeature.GRASS.index:
-                        grass_count += 1
-                elif idx > 0:
-                    self.creatures[idx].draw(display)
+        colors, offset = MapFeature.color_table()
+        for x, y, kinds in blocks(self.kinds, *display.visible_cells()):  # Unwritten chunks are empty, so black
+            display.grid(colors[kinds - offset], origin=(x, y))
+        creatures = list(self.creatures.values())
+        display.circles(
+            [creature.x for creature in creatures],
+            [creature.y for creature in creatures],
+            [creature.radius(creature.energy) for creature in creatures],
+            [creature.COLOR for creature in creatures],
+        )
+        grass_count = count_cells(self.kinds, MapFeature.GRASS.index)
         display.sidebar['Winner streak'] = ''.join(self.winstreak)
         display.sidebar['steps'] = self.steps
         display.sidebar['grass'] = str(round(100 * grass_count / self.size / self.size)) + '%'
@@ -190,6 +283,11 @@ class World:
             display.sidebar[k + ' energy'] = int(self.energies[k])
         display.sidebar['born'] = self.num_creatures_born
         display.sidebar['eaten'] = self.num_creatures_eaten
+        if TIMER.enabled:
+            for key in [key for key in display.sidebar if key.endswith(' ms/step')]:
+                del display.sidebar[key]
+            for name, seconds in slowest(TIMER.rolling(), SIDEBAR_PHASES):
+                display.sidebar[name + ' ms/step'] = f'{1000 * seconds:.2f}'
 
     def get_info(self):
         return ' '.join(k + ': ' + str(v) for k, v in self.counts.items())
@@ -209,10 +307,10 @@ class World:
         elif action == Action.SPLIT:
             # Split, try to find an empty spot
             options = list(Action)[1:-1]
-            random.shuffle(options)
+            self.rng.shuffle(options)
             for option in options:
                 x, y = self.apply_direction(option, creature.x, creature.y)
-                if self.cells[x, y] == 0:
+                if self.kinds[x, y] == MapFeature.EMPTY.index:
                     new_creature = creature.split()
                     break
         else:
@@ -220,23 +318,24 @@ class World:
             self.set_cell(creature.x, creature.y, 0)
             x, y = self.apply_direction(action, creature.x, creature.y)
             if creature.is_predator():
-                if self.cells[x, y] > 0:
+                victim = self.creature_at(x, y)
+                if victim:
                     # Attack
-                    victims.add(self.creatures[self.cells[x, y]])
+                    victims.add(victim)
                     creature.x = x
                     creature.y = y
-                elif self.cells[x, y] in (MapFeature.GRASS.index, MapFeature.EMPTY.index):
+                elif self.kinds[x, y] in (MapFeature.GRASS.index, MapFeature.EMPTY.index):
                     creature.x = x
                     creature.y = y
-            elif self.cells[x, y] in (MapFeature.GRASS.index, MapFeature.EMPTY.index):
-                if self.cells[x, y] == MapFeature.GRASS.index:
+            elif self.kinds[x, y] in (MapFeature.GRASS.index, MapFeature.EMPTY.index):
+                if self.kinds[x, y] == MapFeature.GRASS.index:
                     reward += 1
                     creature.energy += self.settings.grass_energy
                 creature.x = x
                 creature.y = y
             self.set_cell(creature.x, creature.y, creature.id)
             creature.energy -= self.settings.move_cost
-            if self.cells[x, y] == MapFeature.WATER.index:
+            if self.kinds[x, y] == MapFeature.WATER.index:
                 creature.energy = 0
         done = not creature.is_predator() and creature.energy < self.settings.min_energy
 
@@ -260,6 +359,6 @@ class World:
         for y in range(self.size):
             print(f'{y:>2}' + ' ', end='')
             for x in range(self.size):
-                mf = MapFeature(max(1, self.cells[x][y]))
+                mf = MapFeature(self.kinds[x, y])
                 print(f' {mf.char} ', end='')
             print()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Check VectorWorld against World for SmartCows and Wolves.
+
+Decisions must match exactly: every creature of a World is asked for its action, and vector_world.decide
+is given the same observation and the same random numbers. Whole runs can't match step for step, since
+VectorWorld moves all creatures at once, so for those the averages over seeded runs are compared.
+"""
+import argparse
+import contextlib
+import io
+
+import numpy as np
+
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from simplegrid.cow import SmartCow
+from simplegrid.grid_layers import count_cells
+from simplegrid.map_feature import MapFeature
+from simplegrid.vector_world import NUM_DRAWS, SPECIES, VectorWorld, decide
+from simplegrid.wolf import Wolf
+from simplegrid.world import World
+
+
+def populate(world, settings, num_cows, num_wolves):
+    """Reset a World with only SmartCows and Wolves."""
+    settings.population = [{'creature': 'SmartCow', 'count': num_cows}, {'creature': 'Wolf', 'count': num_wolves}]
+    world.reset(Episode())
+
+
+def reference_draws(creature, seed):
+    """The random numbers creature.step draws from a Generator seeded with seed, laid out for vector_world.decide."""
+    values = list(np.random.default_rng(seed).random(NUM_DRAWS))
+    if creature.is_predator():
+        return values
+    return [0] + values[: NUM_DRAWS - 1]
+
+
+def check_decisions(settings, num_steps, seed):
+    settings.seed = seed
+    world = World(settings)
+    populate(world, settings, settings.world_size * settings.world_size // 50, settings.world_size // 10)
+
+    checked = mismatches = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for step in range(num_steps):
+            creatures = list(world.creatures.values())
+            if not creatures:
+                break
+            observations = world.get_observations(creatures)
+            species = np.array([SPECIES.index(type(creature)) for creature in creatures])
+            energies = np.array([creature.energy for creature in creatures])
+            draws = np.array([reference_draws(creature, (seed, step, creature.id)) for creature in creatures])
+            expected = []
+            for creature, observation in zip(creatures, observations):
+                creature.rng = np.random.default_rng((seed, step, creature.id))
+                expected.append(creature.step(observation))
+                creature.rng = world.rng
+            actions = decide(observations, species, energies, draws)
+            checked += len(creatures)
+            mismatches += int(np.count_nonzero(actions != expected))
+            world.step()
+    return checked, mismatches
+
+
+def run(world, settings, num_steps):
+    """Run for num_steps or until the cows are gone and return the statistics to compare."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(num_steps):
+            world.step()
+            if not world.counts:
+                break
+    counts = world.counts
+    grass = count_cells(world.kinds, MapFeature.GRASS.index) / settings.world_size ** 2
+    return [counts.get('SmartCow', 0), world.num_creatures_born, world.num_creatures_eaten, grass]
+
+
+def compare_runs(settings, num_runs, num_steps, num_cows, num_wolves):
+    results = {'World': [], 'VectorWorld': []}
+    for run_idx in range(num_runs):
+        settings.seed = run_idx
+        world = World(settings)
+        populate(world, settings, num_cows, num_wolves)
+        results['World'].append(run(world, settings, num_steps))
+
+        vector_world = VectorWorld(settings, {SmartCow: num_cows, Wolf: num_wolves})
+        vector_world.reset()
+        results['VectorWorld'].append(run(vector_world, settings, num_steps))
+
+    print(f'{"":<12} {"cows":>8} {"born":>8} {"eaten":>8} {"grass":>8}')
+    for name, rows in results.items():
+        cows, born, eaten, grass = np.mean(rows, axis=0)
+        print(f'{name:<12} {cows:8.1f} {born:8.1f} {eaten:8.1f} {grass:8.1%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--experiment',
+        type=str,
+        required=False,
+        help='Specifies the experiment to run. This should be a directory '
+        'where the specific settings and various state files are stored. Directory will '
+        'be created and initialized if it does not exist.',
+    )
+    parser.add_argument('--runs', type=int, default=10, help='Number of seeded runs to compare.')
+    parser.add_argument('--steps', type=int, default=300, help='Steps per run.')
+    args = parser.parse_args()
+
+    settings = ExperimentSettings(args.experiment)
+    settings.stream_episodes = False
+    num_cows = settings.world_size * settings.world_size // 50
+    num_wolves = settings.world_size // 10
+
+    checked, mismatches = check_decisions(settings, 20, seed=0)
+    print(f'decisions: {checked - mismatches}/{checked} match')
+    compare_runs(settings, args.runs, args.steps, num_cows, num_wolves)
@@ -30,7 +30,7 @@ def run_scenario(scenario, creature, world, verbose, *, repetitions=1, show_weig
     x = (FAKE_WORLD_SIZE - w) // 2
     y = (FAKE_WORLD_SIZE - h) // 2
     world.reset(MagicMock(), 0)
-    world.cells[x : x + w, y : y + h] = environment
+    world.load_environment(x, y, environment)
     creature.x = FAKE_WORLD_SIZE // 2
     creature.y = FAKE_WORLD_SIZE // 2
     world.add_new_creature(creature)
@@ -111,12 +111,12 @@ if __name__ == '__main__':
     scenario_files = [os.path.join(TESTS_DIR, scenario_file) for scenario_file in scenario_files]
 
     settings.world_size = FAKE_WORLD_SIZE
-    settings.start_num_creatures = 0
-    fake_world = World(settings, MagicMock())
+    settings.population = []
+    fake_world = World(settings)
 
-    DeepCow.restore_state(settings)
-    DeepCow.agent.epsilon = 0.0
     CreatureClass = CREATURES[args.creature]
+    if CreatureClass is DeepCow:
+        DeepCow.ensure_agent(settings).epsilon = 0.0
     creature = CreatureClass(0, 0, settings)
 
     correct = 0
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""Train the DeepCow agent on experience collected by several worlds running in parallel."""
+import argparse
+import os
+
+from shared.experiment_settings import ExperimentSettings
+from simplegrid.rollout import train
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--experiment',
+        type=str,
+        required=False,
+        help='Specifies the experiment to run. This should be a directory '
+        'where the specific settings and various state files are stored. Directory will '
+        'be created and initialized if it does not exist.',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Number of worlds to run in parallel. Defaults to the number of cores.',
+    )
+    args = parser.parse_args()
+    train(ExperimentSettings(args.experiment), args.workers)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""Play back a recorded episode, jumping to any frame without re-simulating.
+
+Keys: space plays or pauses, left/right step a frame, page up/down step 100 frames, home/end jump to
+the start/end and a/z zoom. Clicking in the world jumps to the frame at that fraction of the episode.
+"""
+import argparse
+import contextlib
+from collections import Counter
+
+import numpy as np
+
+with contextlib.redirect_stdout(None):  # Suppress Hello from Pygame community message
+    import pygame
+
+from shared.display import Display
+from shared.episode import Episode
+from shared.experiment_settings import ExperimentSettings
+from shared.replay import EpisodeReplay
+from simplegrid.abstractcreature import AbstractCreature
+from simplegrid.map_feature import MapFeature
+
+FRAME_RATE = 60
+TITLE = 'Reinforced Artificial Life - replay'
+SEEK_KEYS = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1, pygame.K_PAGEUP: -100, pygame.K_PAGEDOWN: 100}
+
+
+def draw_frame(display, grid, creatures):
+    colors, offset = MapFeature.color_table()
+    display.grid(colors[np.minimum(grid, 0) - offset])
+    counts = Counter()
+    xs, ys, radii, circle_colors = [], [], [], []
+    for x, y in zip(*(grid > 0).nonzero()):
+        energy, creature_type = creatures.get(grid[x, y], (0, None))
+        creature_class = AbstractCreature.registry.get(creature_type)
+        if creature_class:
+            xs.append(x)
+            ys.append(y)
+            radii.append(creature_class.radius(energy))
+            circle_colors.append(creature_class.COLOR)
+            counts[creature_type] += 1
+    display.circles(xs, ys, radii, circle_colors)
+    for creature_type, count in counts.items():
+        display.sidebar[creature_type + 's'] = count
+
+
+def main(settings, episode_file):
+    AbstractCreature.load_registry()  # Episodes refer to creatures by class name
+    replay = EpisodeReplay(Episode.load(episode_file), settings.world_size)
+    display = Display(TITLE, settings.world_size, settings.scale)
+    clock = pygame.time.Clock()
+
+    frame = 0
+    playing = True
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                elif event.key in SEEK_KEYS:
+                    frame += SEEK_KEYS[event.key]
+                elif event.key == pygame.K_HOME:
+                    frame = 0
+                elif event.key == pygame.K_END:
+                    frame = len(replay) - 1
+                elif event.key == pygame.K_RETURN:
+                    display.reset_offsets()
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.pos[0] < display.width:
+                frame = len(replay) * event.pos[0] // display.width
+
+        keys_down = pygame.key.get_pressed()
+        if keys_down[pygame.K_a]:
+            display.scale *= 1.05
+        elif keys_down[pygame.K_z]:
+            display.scale /= 1.05
+
+        frame = max(0, min(frame, len(replay) - 1))
+        grid, creatures = replay.frame(frame)
+        display.sidebar.clear()
+        display.sidebar['frame'] = f'{frame}/{len(replay)}'
+        display.clear()
+        draw_frame(display, grid, creatures)
+        clock.tick(FRAME_RATE)
+        display.flip()
+        if playing and frame < len(replay) - 1:
+            frame += 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--experiment',
+        type=str,
+        required=False,
+        help='Specifies the experiment whose recorded episode to play back. Its settings give the world size.',
+    )
+    parser.add_argument(
+        '--episode',
+        type=str,
+        required=False,
+        help='Episode file to play back (.npz, .jsonl or .jsonl.gz). Defaults to episodes.npz of the experiment.',
+    )
+    args = parser.parse_args()
+    settings = ExperimentSettings(args.experiment)
+    episode_file = args.episode or settings.get_path('episodes.npz')
+    if not episode_file:
+        parser.error('Pass --episode or an --experiment that recorded an episode')
+    pygame.init()
+    try:
+        main(settings, episode_file)
+    finally:
+        pygame.quit()